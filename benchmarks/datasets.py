@@ -0,0 +1,110 @@
+# encoding: utf8
+'''
+Generators for synthetic data sets resembling the examples.
+
+All generators are deterministic, so runs with the same number of records
+are comparable. The data has the shape the example templates expect:
+
+  * `inventory()` like `examples/IT-inventory/edvdata.yaml`
+  * `phonelist()` like the CSV data of `examples/Phonelist`
+  * `authors()` and `publications()` like the Juser data of
+    `examples/Juser-authors`
+'''
+import random
+
+TYPES = ['laptop', 'desktop', 'screen', 'printer', 'phone', 'server']
+MANUFACTURERS = ['Lenovo', 'DELL', 'EIZO', 'HP', 'Apple', 'Fujitsu']
+STATES = ['INUSE', 'STOCK', 'REPAIR', 'DISPOSED']
+FAMILIES = ['Smith', 'Meyer', 'Schmidt', 'Garcia', 'Rossi', 'Nowak', 'Kim',
+            'Dubois', 'Jansen', 'Silva', 'Novak', 'Berg']
+GIVEN = ['Anna', 'Ben', 'Clara', 'David', 'Eva', 'Felix', 'Greta', 'Hans']
+WORDS = ['neural', 'network', 'model', 'cortex', 'simulation', 'dynamics',
+         'spiking', 'analysis', 'data', 'large', 'scale', 'activity']
+
+
+def inventory(records, seed=0):
+    '''
+    Return an inventory with given number of serials.
+    '''
+    rnd = random.Random(seed)
+    serial = dict()
+    for i in range(records):
+        history = list()
+        for event in range(rnd.randint(1, 3)):
+            history.append({
+                ['installed', 'moved', 'returned'][event]: {
+                    'date': '20%02d-%02d-%02d' % (rnd.randint(10, 19), rnd.randint(1, 12), rnd.randint(1, 28)),
+                    'newstate': rnd.choice(STATES),
+                    'references': [['computer', 'inm%05d' % rnd.randint(0, records)]],
+                },
+            })
+        serial['SN%08d' % i] = {
+            'type': rnd.choice(TYPES),
+            'manufacturer': rnd.choice(MANUFACTURERS),
+            'model': 'Model %d' % rnd.randint(100, 999),
+            'history': history,
+        }
+    return {'serial': serial}
+
+
+INVENTORY_RULES = {
+    'type': 'dict',
+    'keys': {'type': 'str'},
+    'values': {
+        'type': 'dict',
+        'keys': {'type': 'str', 'regex': r'SN\d+'},
+        'values': {
+            'type': 'dictdescent',
+            'mandatory': ['type', 'manufacturer', 'model', 'history'],
+        },
+    },
+}
+
+
+def phonelist(records, seed=0):
+    '''
+    Return a list of phone list rows with the columns Name, Room, Phone and
+    Building.
+    '''
+    rnd = random.Random(seed)
+    return [{
+        'Name': '%s, %s' % (rnd.choice(FAMILIES), rnd.choice(GIVEN)),
+        'Room': '%d.%03d' % (rnd.randint(1, 5), rnd.randint(1, 300)),
+        'Phone': '+49 2461 61-%04d' % rnd.randint(0, 9999),
+        'Building': '%02d.%d' % (rnd.randint(1, 20), rnd.randint(1, 9)),
+    } for _ in range(records)]
+
+
+def authors(records, seed=0):
+    '''
+    Return an author database mapping "Family, Given" to a list of
+    registrations.
+    '''
+    rnd = random.Random(seed)
+    result = dict()
+    for i in range(records):
+        family = '%s%d' % (rnd.choice(FAMILIES), i)
+        given = rnd.choice(GIVEN)
+        result['%s, %s' % (family, given)] = [{
+            'family': family,
+            'given': given,
+            'registry': rnd.choice(['DE-Juel1', 'DE-588', 'ORCID']),
+            'id': '%08d' % rnd.randint(0, 10**8),
+        } for _ in range(rnd.randint(1, 2))]
+    return result
+
+
+def publications(records, seed=0):
+    '''
+    Return a publication list in the format produced by pandoc-citeproc.
+    '''
+    rnd = random.Random(seed)
+    return {'references': [{
+        'id': 'FZJ-%d-%05d' % (rnd.randint(2010, 2019), i),
+        'type': rnd.choice(['article-journal', 'paper-conference', 'thesis']),
+        'title': ' '.join(rnd.choice(WORDS) for _ in range(6)).capitalize(),
+        'author': [{'family': rnd.choice(FAMILIES), 'given': rnd.choice(GIVEN)}
+                   for _ in range(rnd.randint(1, 6))],
+        'abstract': ' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(0, 80))),
+        'URL': 'https://juser.fz-juelich.de/record/%d' % i,
+    } for i in range(records)]}
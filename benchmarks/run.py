@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# encoding: utf8
+'''
+Usage: run [options] [<benchmark>...]
+
+   Run the benchmarks of reporter and verify on synthetic data sets and
+   print the best time of every benchmark and data set size.
+
+   The data sets are created by `datasets.py` and resemble the examples: an
+   IT inventory, a phone list and the author and publication lists of the
+   Juser example. Benchmarks are selected by giving names or prefixes of
+   their names, e.g. `load` or `render-authorlist`; the default is to run
+   all of them. Use --list to see the names.
+
+   Results can be stored as a baseline with --save and later runs can be
+   compared to it with --compare. The exit status is 1 if a benchmark got
+   slower than the baseline by more than the threshold factor.
+
+Options:
+    -n, --records=<N,...>
+        comma separated numbers of records of the data sets
+        [default: 10000]
+
+    -r, --repeat=<N>
+        number of repetitions, the best is reported [default: 3]
+
+    --datadir=<dir>
+        directory for the generated data files, which are reused by later
+        runs. A temporary directory is used by default.
+
+    --save=<file>
+        store the results as JSON in the given file
+
+    --compare=<file>
+        compare the results to a baseline stored with --save
+
+    --threshold=<factor>
+        report benchmarks which are slower than the baseline by more than
+        this factor as regressions [default: 1.2]
+
+    -l, --list      list the benchmarks and exit
+    -h, --help      print this text
+    -v, --verbose   give more details about the processing
+'''
+from docopt import docopt
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from datareport import binary
+from datareport import reporter
+from datareport.verify import Validator
+import datasets
+
+log = logging.getLogger()
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+TEMPLATES = {
+    'authorlist': (os.path.join(EXAMPLES, 'Juser-authors', 'templates'), 'AuthorList.md'),
+    'publications': (os.path.join(EXAMPLES, 'Juser-authors', 'templates'), 'PublicationsList.md'),
+    'inventory': (os.path.join(EXAMPLES, 'IT-inventory'), 'IT-Inventory.template'),
+    'phonelist': (os.path.join(EXAMPLES, 'Phonelist', 'templates'), 'Phonelist.md'),
+    'sorted': (os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates'), 'SortedPublications.md'),
+}
+
+
+def writefile(data, filename, fileformat):
+    '''
+    Write `data` to `filename` in the given format, unless the file exists.
+    '''
+    if os.path.exists(filename):
+        return
+    log.info("writing %s...", filename)
+    tmpname = filename + '.tmp'
+    if fileformat == 'binary':
+        binary.dump(data, tmpname)
+    else:
+        with open(tmpname, 'w') as outfile:
+            if fileformat == 'yaml':
+                from ruamel.yaml import YAML
+                YAML(typ='safe').dump(data, outfile)
+            elif fileformat == 'json':
+                json.dump(data, outfile)
+            elif fileformat == 'csv':
+                import csv
+                writer = csv.DictWriter(outfile, fieldnames=list(data[0]))
+                writer.writeheader()
+                writer.writerows(data)
+    os.replace(tmpname, filename)
+
+
+def loadbenchmark(dataset, fileformat, loadertype):
+    def setup(datadir, records):
+        extension = {'yaml': '.yaml', 'json': '.json', 'csv': '.csv', 'binary': '.drb'}[fileformat]
+        filename = os.path.join(datadir, '%s-%d%s' % (dataset, records, extension))
+        writefile(getattr(datasets, dataset)(records), filename, fileformat)
+        def run():
+            data = reporter.loadfile(filename, loadertype)
+            # lazy formats are only read when used, so touch every record
+            for _ in (data.values() if hasattr(data, 'values') else data):
+                pass
+        return run
+    return setup
+
+
+def renderbenchmark(template, **data):
+    def setup(datadir, records):
+        templatedir, name = TEMPLATES[template]
+        tmpl = reporter.makeenvironment(templatedir, []).get_template(name)
+        values = {key: getattr(datasets, dataset)(records) for key, dataset in data.items()}
+        values['year'] = 2017
+        return lambda: reporter.writereport(tmpl, values, os.devnull)
+    return setup
+
+
+def verifybenchmark(method):
+    def setup(datadir, records):
+        validator = Validator(rules=datasets.INVENTORY_RULES)
+        data = datasets.inventory(records)
+        return lambda: getattr(validator, method)(data)
+    return setup
+
+
+BENCHMARKS = [
+    ('load-yaml-inventory', loadbenchmark('inventory', 'yaml', 'yaml:safe')),
+    ('load-libyaml-inventory', loadbenchmark('inventory', 'yaml', 'libyaml')),
+    ('load-json-inventory', loadbenchmark('inventory', 'json', 'json')),
+    ('load-binary-inventory', loadbenchmark('inventory', 'binary', 'binary')),
+    ('load-csv-phonelist', loadbenchmark('phonelist', 'csv', 'csv')),
+    ('load-libyaml-publications', loadbenchmark('publications', 'yaml', 'libyaml')),
+    ('render-authorlist', renderbenchmark('authorlist', list='authors')),
+    ('render-publications', renderbenchmark('publications', publications='publications')),
+    ('render-inventory', renderbenchmark('inventory', data='inventory')),
+    ('render-phonelist', renderbenchmark('phonelist', phonelist='phonelist')),
+    ('render-sorted', renderbenchmark('sorted', publications='publications', phonelist='phonelist')),
+    ('verify-validate', verifybenchmark('validate')),
+    ('verify-violations', verifybenchmark('violations')),
+]
+
+
+def measure(run, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return best
+
+
+def runbenchmarks(names, sizes, repeat, datadir):
+    results = dict()
+    for name, setup in BENCHMARKS:
+        if names and not any(name.startswith(prefix) for prefix in names):
+            continue
+        for records in sizes:
+            run = setup(datadir, records)
+            seconds = measure(run, repeat)
+            results.setdefault(name, dict())[str(records)] = seconds
+            print("%-30s %10d %10.4f s" % (name, records, seconds))
+            sys.stdout.flush()
+    return results
+
+
+def compare(results, baseline, threshold):
+    '''
+    Print the ratio of current and baseline times and return the number of
+    benchmarks which got slower by more than `threshold`.
+    '''
+    regressions = 0
+    print()
+    print("%-30s %10s %10s %10s %7s" % ("benchmark", "records", "baseline", "current", "ratio"))
+    for name, sizes in sorted(results.items()):
+        for records, seconds in sorted(sizes.items(), key=lambda item: int(item[0])):
+            before = baseline.get(name, dict()).get(records)
+            if before is None:
+                print("%-30s %10s %10s %10.4f %7s" % (name, records, "-", seconds, "new"))
+                continue
+            ratio = seconds / before
+            flag = ""
+            if ratio > threshold:
+                flag = "  SLOWER"
+                regressions += 1
+            elif ratio < 1 / threshold:
+                flag = "  faster"
+            print("%-30s %10s %10.4f %10.4f %7.2f%s" % (name, records, before, seconds, ratio, flag))
+    return regressions
+
+
+def main(cmdline=None):
+    args = docopt(__doc__, argv=cmdline)
+    log.setLevel(logging.INFO if args['--verbose'] else logging.WARNING)
+
+    if args['--list']:
+        for name, _ in BENCHMARKS:
+            print(name)
+        return 0
+
+    sizes = [int(records) for records in args['--records'].split(',')]
+    datadir = args['--datadir']
+    if datadir is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        datadir = tmpdir.name
+    os.makedirs(datadir, exist_ok=True)
+
+    results = runbenchmarks(args['<benchmark>'], sizes, int(args['--repeat']), datadir)
+
+    if args['--save']:
+        with open(args['--save'], 'w') as outfile:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'results': results,
+            }, outfile, indent=1, sort_keys=True)
+
+    if args['--compare']:
+        with open(args['--compare']) as infile:
+            baseline = json.load(infile)['results']
+        if compare(results, baseline, float(args['--threshold'])):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
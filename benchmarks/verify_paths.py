@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# encoding: utf8
+'''
+Usage: verify_paths [options] [<verifymodule>...]
+
+   Benchmark the hot path of `verify.Validator` on a large nested inventory.
+
+   The data set resembles `examples/IT-inventory/edvdata.yaml`: a dict of
+   serials, each with a few string fields and a history list. Every given
+   <verifymodule> (a path to a verify.py, default: the one of this source tree)
+   is timed on the same data, so an older implementation can be compared to
+   the current one, e.g. with
+
+      git show HEAD~1:datareport/verify.py > /tmp/verify_old.py
+      python benchmarks/verify_paths.py /tmp/verify_old.py datareport/verify.py
+
+   For each module the time per validated node and the peak of the memory
+   allocated during validation (from tracemalloc) are printed. CPython has no
+   cheap counter for short-lived allocations, so the removed per-node path
+   lists and strings show up as time per node.
+
+Options:
+    -n, --records=<N>   number of inventory records [default: 20000]
+    -r, --repeat=<N>    number of repetitions, the best is reported [default: 5]
+    -h, --help          print this text
+'''
+from docopt import docopt
+import importlib.util
+import logging
+import os.path
+import time
+import tracemalloc
+
+RULES = {
+    'type': 'dict',
+    'keys': {'type': 'str'},
+    'values': {
+        'type': 'dict',
+        'keys': {'type': 'str', 'regex': r'[a-z]+'},
+        'values': {
+            'type': 'in',
+            'values': [
+                {'type': 'str'},
+                {'type': 'list', 'values': {
+                    'type': 'dict',
+                    'keys': {'type': 'str'},
+                    'values': {'type': 'dict', 'values': {'type': 'str'}},
+                }},
+            ],
+        },
+    },
+}
+
+def inventory(records):
+    '''
+    Return a synthetic inventory with given number of records and the number
+    of nodes it contains.
+    '''
+    data = dict()
+    for i in range(records):
+        data["SN%08d" % i] = {
+            'type': 'laptop',
+            'manufacturer': 'Lenovo',
+            'model': 'ThinkPad X230',
+            'history': [
+                {'installed': {'date': '2017-01-%02d' % (i % 28 + 1), 'newstate': 'INUSE'}},
+                {'returned': {'date': '2018-01-01', 'newstate': 'STOCK'}},
+            ],
+        }
+    # per record: 1 key + 1 record dict + 4 keys + 4 values + 2 history
+    # entries with 1 key, 1 dict, 2 keys and 2 values each
+    return data, records * (10 + 2 * 6)
+
+def loadmodule(filename):
+    spec = importlib.util.spec_from_file_location("verify_%d" % abs(hash(filename)), filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def measure(module, data, repeat):
+    logging.getLogger().setLevel(100)
+    validator = module.Validator(rules=RULES)
+    assert validator.validate(data)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        validator.validate(data)
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    tracemalloc.start()
+    validator.validate(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+if __name__ == '__main__':
+    args = docopt(__doc__)
+    modules = args['<verifymodule>'] or [
+        os.path.join(os.path.dirname(__file__), '..', 'datareport', 'verify.py')]
+    data, nodes = inventory(int(args['--records']))
+    print("%-40s %12s %12s" % ("module", "ns/node", "peak KiB"))
+    for filename in modules:
+        duration, peak = measure(loadmodule(filename), data, int(args['--repeat']))
+        print("%-40s %12.1f %12.1f" % (filename, duration / nodes * 1e9, peak / 1024))
@@ -0,0 +1,268 @@
+# encoding: utf8
+'''
+Compact binary format for data files, which can be read lazily.
+
+Parsing large YAML files takes much longer than using the data in a template,
+in particular if the template only uses a small part of it. Files in this
+format are memory-mapped and only the parts which are accessed are decoded.
+
+The file starts with a magic string and ends with the offset of the root
+node. Every node starts with a tag byte:
+
+    'P'  <length> <pickle>
+         a python object stored with pickle
+    'D'  <count> <length> <pickled list of keys> <count offsets>
+         a dict, whose values are nodes at the given offsets
+    'L'  <count> <count offsets>
+         a list, whose elements are nodes at the given offsets
+
+All numbers are unsigned 64 bit little endian integers. Small containers are
+stored as one pickle, since decoding them at once is faster than decoding
+their elements one by one.
+
+Pickles can run arbitrary code when they are loaded. Since binary files are
+loaded automatically by their extension, the pickles are loaded with an
+unpickler which only allows the types the data loaders create: the builtin
+scalars and containers, sets, bytes and the types of the `datetime` module.
+Subclasses of dict and list, like ordered dicts, are stored as plain dicts
+and lists, and subclasses of scalar types, like those of the ruamel round
+trip loader, as their base types. Other objects cannot be stored.
+
+Dicts and lists are returned as read-only `LazyDict` and `LazyList` objects,
+which decode their elements on first access.
+'''
+from collections.abc import Mapping, Sequence, Set as AbstractSet
+import datetime
+import io
+import mmap
+import os
+import pickle
+import struct
+
+MAGIC = b'DRBIN1\n\0'
+_number = struct.Struct('<Q')
+
+# containers whose elements need less bytes are pickled in one piece
+INLINE_LIMIT = 4096
+
+# the only classes which may be loaded from the pickles, besides the types
+# pickle stores without looking up a class, like str, int, list or dict
+SAFE_CLASSES = set([
+    ('builtins', 'set'),
+    ('builtins', 'frozenset'),
+    ('builtins', 'bytearray'),
+    ('builtins', 'complex'),
+    ('datetime', 'date'),
+    ('datetime', 'datetime'),
+    ('datetime', 'time'),
+    ('datetime', 'timedelta'),
+    ('datetime', 'timezone'),
+])
+
+
+class SafeUnpickler(pickle.Unpickler):
+    '''
+    Unpickler which refuses to load any class but the `SAFE_CLASSES`.
+    '''
+    def find_class(self, module, name):
+        if (module, name) not in SAFE_CLASSES:
+            raise pickle.UnpicklingError("%s.%s is not allowed in binary data files" % (module, name))
+        return super(SafeUnpickler, self).find_class(module, name)
+
+
+def _loads(blob):
+    return SafeUnpickler(io.BytesIO(blob)).load()
+
+
+# types which are stored as they are; instances of their subclasses, like the
+# scalars of the ruamel round trip loader, are stored as the base type
+_SCALARS = (type(None), bool, int, float, complex, str, bytes, bytearray,
+            datetime.datetime, datetime.date, datetime.time, datetime.timedelta)
+
+
+def _plain(data):
+    '''
+    Return `data` with all objects replaced by types which `SafeUnpickler`
+    can load. Raises ValueError for objects which cannot be stored.
+    '''
+    # subclasses would be pickled with their class
+    if isinstance(data, dict):
+        return {_plain(key): _plain(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_plain(value) for value in data]
+    if isinstance(data, tuple):
+        return tuple(_plain(value) for value in data)
+    if isinstance(data, AbstractSet):
+        values = (_plain(value) for value in data)
+        return frozenset(values) if isinstance(data, frozenset) else set(values)
+    if type(data) in _SCALARS:
+        if isinstance(data, (datetime.datetime, datetime.time)) and data.tzinfo is not None \
+                and type(data.tzinfo) is not datetime.timezone:
+            raise ValueError("cannot store time zone %r in binary files" % data.tzinfo)
+        return data
+    if type(data).__name__ == 'ScalarBoolean':  # an int subclass of ruamel
+        return bool(data)
+    for base in (int, float, complex, str, bytes):
+        if isinstance(data, base):
+            return base(data)
+    if isinstance(data, datetime.datetime):
+        return _plain(datetime.datetime.combine(data.date(), data.timetz()))
+    if isinstance(data, datetime.date):
+        return datetime.date(data.year, data.month, data.day)
+    raise ValueError("cannot store objects of type %s in binary files" % type(data).__name__)
+
+
+def dump(data, filename, inline=INLINE_LIMIT):
+    '''
+    Write `data` to the file with given name in the binary format.
+    '''
+    tmpname = filename + '.tmp'
+    try:
+        with open(tmpname, 'wb') as outfile:
+            outfile.write(MAGIC)
+            kind, value = _encode(data, outfile, inline)
+            root = _write(outfile, value) if kind == 'blob' else value
+            outfile.write(_number.pack(root))
+    except Exception:
+        os.remove(tmpname)
+        raise
+    os.replace(tmpname, filename)
+
+
+def _write(outfile, blob):
+    offset = outfile.tell()
+    outfile.write(b'P')
+    outfile.write(_number.pack(len(blob)))
+    outfile.write(blob)
+    return offset
+
+
+def _encode(data, outfile, inline):
+    '''
+    Encode `data` and return either ('blob', <pickle>) for small objects
+    which are not yet written, or ('node', <offset>) for written nodes.
+    '''
+    if isinstance(data, dict):
+        keys = list(data.keys())
+        children = [_encode(value, outfile, inline) for value in data.values()]
+    elif isinstance(data, (list, tuple)):
+        keys = None
+        children = [_encode(value, outfile, inline) for value in data]
+    else:
+        return 'blob', pickle.dumps(_plain(data), pickle.HIGHEST_PROTOCOL)
+
+    if all(kind == 'blob' for kind, _ in children) \
+            and sum(len(blob) for _, blob in children) < inline:
+        return 'blob', pickle.dumps(_plain(data), pickle.HIGHEST_PROTOCOL)
+
+    offsets = [_write(outfile, value) if kind == 'blob' else value
+               for kind, value in children]
+    offset = outfile.tell()
+    if keys is None:
+        outfile.write(b'L')
+        outfile.write(_number.pack(len(offsets)))
+    else:
+        keyblob = pickle.dumps(_plain(keys), pickle.HIGHEST_PROTOCOL)
+        outfile.write(b'D')
+        outfile.write(_number.pack(len(offsets)))
+        outfile.write(_number.pack(len(keyblob)))
+        outfile.write(keyblob)
+    outfile.write(struct.pack('<%dQ' % len(offsets), *offsets))
+    return 'node', offset
+
+
+def load(filename):
+    '''
+    Memory-map the file with given name and return its root object.
+    '''
+    with open(filename, 'rb') as infile:
+        buf = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+    if buf[:len(MAGIC)] != MAGIC:
+        raise ValueError("%s is not a datareport binary file" % filename)
+    root, = _number.unpack_from(buf, len(buf) - _number.size)
+    return _decode(buf, root)
+
+
+def _decode(buf, offset):
+    tag = buf[offset:offset+1]
+    if tag == b'P':
+        length, = _number.unpack_from(buf, offset + 1)
+        start = offset + 1 + _number.size
+        return _loads(buf[start:start+length])
+    if tag == b'D':
+        _, length = struct.unpack_from('<2Q', buf, offset + 1)
+        start = offset + 1 + 2 * _number.size
+        keys = _loads(buf[start:start+length])
+        return LazyDict(buf, keys, start + length)
+    if tag == b'L':
+        count, = _number.unpack_from(buf, offset + 1)
+        return LazyList(buf, count, offset + 1 + _number.size)
+    raise ValueError("invalid node at offset %d" % offset)
+
+
+class LazyDict(Mapping):
+    '''
+    Read-only dict, whose values are decoded on first access.
+    '''
+    __slots__ = ('_buf', '_index', '_table', '_values')
+
+    def __init__(self, buf, keys, table):
+        self._buf = buf
+        self._index = {key: i for i, key in enumerate(keys)}
+        self._table = table
+        self._values = dict()
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        offset, = _number.unpack_from(self._buf, self._table + self._index[key] * _number.size)
+        value = self._values[key] = _decode(self._buf, offset)
+        return value
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __repr__(self):
+        return "LazyDict(%d keys)" % len(self)
+
+
+class LazyList(Sequence):
+    '''
+    Read-only list, whose elements are decoded on first access.
+    '''
+    __slots__ = ('_buf', '_count', '_table', '_values')
+
+    def __init__(self, buf, count, table):
+        self._buf = buf
+        self._count = count
+        self._table = table
+        self._values = dict()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("list index out of range")
+        try:
+            return self._values[index]
+        except KeyError:
+            pass
+        offset, = _number.unpack_from(self._buf, self._table + index * _number.size)
+        value = self._values[index] = _decode(self._buf, offset)
+        return value
+
+    def __len__(self):
+        return self._count
+
+    def __repr__(self):
+        return "LazyList(%d elements)" % len(self)
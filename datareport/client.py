@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# encoding: utf8
+'''
+Thin client for the reporter server.
+
+`reporter-client` takes the same arguments as `reporter`. It sends them to
+the server started with `reporter-server`, which renders the report in the
+working directory of the client, and prints the output and the messages of
+the server. If no server is running, the report is created by running the
+reporter in this process.
+
+Only modules of the standard library which python loads anyway are imported
+here, so the client starts much faster than the reporter.
+'''
+import json
+import os
+import socket
+import sys
+
+
+def socketpath():
+    '''
+    Return the default path of the server socket.
+    '''
+    if 'DATAREPORT_SOCKET' in os.environ:
+        return os.environ['DATAREPORT_SOCKET']
+    directory = os.environ.get('XDG_RUNTIME_DIR')
+    if not directory:
+        import tempfile
+        directory = tempfile.gettempdir()
+    return os.path.join(directory, 'datareport-%d.sock' % os.getuid())
+
+
+def connect(path):
+    '''
+    Return a connection to the server listening on `path`, or None if no
+    server is running.
+    '''
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(path)
+    except OSError:
+        connection.close()
+        return None
+    return connection
+
+
+def request(connection, message, stdout=None, stderr=None):
+    '''
+    Send `message` to the server, write the output and messages of the
+    server to `stdout` and `stderr` and return the exit status of the
+    request.
+    '''
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    try:
+        connection.sendall(json.dumps(message).encode('utf8') + b'\n')
+        with connection.makefile('rb') as replies:
+            for line in replies:
+                reply = json.loads(line.decode('utf8'))
+                if 'stdout' in reply:
+                    stdout.write(reply['stdout'])
+                elif 'stderr' in reply:
+                    stderr.write(reply['stderr'])
+                elif 'exit' in reply:
+                    return reply['exit']
+    finally:
+        connection.close()
+    stderr.write("connection to the server was closed\n")
+    return 1
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    connection = connect(socketpath())
+    if connection is not None:
+        return request(connection, {'argv': argv, 'cwd': os.getcwd()})
+    try:
+        from datareport import reporter
+    except ImportError:  # running as script from the source tree
+        import reporter
+    return reporter.main(argv)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
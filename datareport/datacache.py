@@ -0,0 +1,142 @@
+# encoding: utf8
+'''
+On-disk cache for parsed data files.
+
+Parsing large YAML files is by far the most expensive step of a reporter run.
+The `DataCache` stores the parsed python objects as pickles in a cache
+directory, so that unchanged data files can be loaded again without parsing.
+
+A cache entry is identified by the absolute path of the data file and the
+loader used to parse it. Each entry starts with a fixed-size header with the
+size, modification time and content hash of the data file. If size and
+modification time still match, the entry is used directly. Otherwise the
+content hash is compared, so that files which were only touched (e.g. by a
+fresh checkout) do not need to be parsed again; only the header of their entry
+is rewritten.
+
+The cache is bounded in size. Whenever a new entry is stored, the least
+recently used entries are removed until the total size is below the limit.
+'''
+import hashlib
+import logging
+import os
+import pickle
+import struct
+import tempfile
+
+log = logging.getLogger()
+
+CACHE_VERSION = 2
+
+# size and modification time in nanoseconds of the data file, and the SHA-256
+# digest of its content
+_HEADER = struct.Struct('<QQ32s')
+
+
+def filedigest(filename, blocksize=1 << 20):
+    '''
+    Return the SHA-256 hex digest of the content of the given file.
+    '''
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as infile:
+        for block in iter(lambda: infile.read(blocksize), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DataCache(object):
+    def __init__(self, cachedir, maxsize=1024 * 1024 * 1024):
+        '''
+        Initialize a cache in directory `cachedir`, which is created if
+        needed. The total size of all entries is kept below `maxsize` bytes.
+        '''
+        self.cachedir = cachedir
+        self.maxsize = maxsize
+        os.makedirs(cachedir, exist_ok=True)
+
+    def _entryname(self, filename, loadertype):
+        key = "%s\0%s\0%d" % (os.path.abspath(filename), loadertype, CACHE_VERSION)
+        return os.path.join(self.cachedir,
+                            hashlib.sha256(key.encode('utf8')).hexdigest() + '.pickle')
+
+    def load(self, filename, loadertype, loader):
+        '''
+        Return the data of `filename` parsed with `loader`. The result is
+        taken from the cache if the file did not change since it was stored
+        with the same `loadertype`, otherwise the file is parsed and the cache
+        entry is updated.
+        '''
+        entryname = self._entryname(filename, loadertype)
+        stat = os.stat(filename)
+        header = None
+        try:
+            with open(entryname, 'rb') as entry:
+                header = _HEADER.unpack(entry.read(_HEADER.size))
+                if header[:2] == (stat.st_size, stat.st_mtime_ns):
+                    log.debug("cache hit for '%s' (%s)", filename, loadertype)
+                    data = pickle.load(entry)
+                    os.utime(entryname)
+                    return data
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            log.warning("ignoring broken cache entry %s: %s", entryname, e)
+            header = None
+
+        digest = filedigest(filename)
+        if header is not None and header[0] == stat.st_size and header[2] == bytes.fromhex(digest):
+            log.debug("cache hit for '%s' (%s) by content", filename, loadertype)
+            with open(entryname, 'r+b') as entry:
+                entry.seek(_HEADER.size)
+                data = pickle.load(entry)
+                # only the modification time changed, the data is kept
+                entry.seek(0)
+                entry.write(_HEADER.pack(stat.st_size, stat.st_mtime_ns, header[2]))
+            return data
+
+        log.debug("cache miss for '%s' (%s)", filename, loadertype)
+        with open(filename, 'r') as infile:
+            data = loader(infile)
+        self._store(entryname, stat, digest, data)
+        return data
+
+    def _store(self, entryname, stat, digest, data):
+        header = _HEADER.pack(stat.st_size, stat.st_mtime_ns, bytes.fromhex(digest))
+        # write to a temporary file first, so concurrent readers never see
+        # partially written entries
+        fd, tmpname = tempfile.mkstemp(dir=self.cachedir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as entry:
+                entry.write(header)
+                pickle.dump(data, entry, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpname, entryname)
+        except Exception as e:
+            log.warning("could not store cache entry for %s: %s", entryname, e)
+            os.unlink(tmpname)
+            return
+        self.evict()
+
+    def evict(self):
+        '''
+        Remove least recently used entries until the total size of the cache
+        is below the configured maximum.
+        '''
+        entries = list()
+        for name in os.listdir(self.cachedir):
+            if not name.endswith('.pickle'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cachedir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.maxsize:
+                break
+            log.debug("evicting cache entry %s", name)
+            try:
+                os.unlink(os.path.join(self.cachedir, name))
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,171 @@
+# encoding: utf8
+'''
+Memoizing versions of the jinja2 filters groupby, sort and selectattr.
+
+Templates often group, sort or select from the same data several times per
+render, e.g. once per section of a report. The filters of this module keep
+the result of calls on the data for the rest of the render, so the data is
+scanned and sorted only once per object and arguments. For `selectattr` with
+an equality test, an index of the data by the tested attribute is built once
+and every selection is a single lookup:
+
+    {% for group in authors | groupby("0.registry") %}          scanned once
+    {% for pub in pubs | selectattr("type", "eq", kind) %}     indexed lookup
+
+Only results for the datadefs and the variables set at the top level of the
+template are kept, e.g. `{% set pubs = data.publications %}`, since they
+live for the whole render anyway. Other values, like `group.list` in a loop,
+`dict.values()` or the result of other filters, are usually created anew for
+every call, so the builtin filter is used for them and nothing is kept in
+memory. The filters return new lists, or an iterator for `selectattr`, like
+the builtin filters. The data must not change during the render.
+
+The `memoize` decorator adds the same caching to the filters loaded with
+--filter. It is available in filter files without import:
+
+    @memoize
+    def expensive(value, argument):
+        ...
+'''
+from collections.abc import ItemsView, Iterator, KeysView, ValuesView
+from functools import wraps
+import weakref
+from jinja2 import filters as builtins
+from jinja2.tests import TESTS
+try:
+    from jinja2 import pass_context
+except ImportError:  # jinja2 < 3.0
+    from jinja2 import contextfilter as pass_context
+
+# the caches of the renders in progress, by template context
+_caches = weakref.WeakKeyDictionary()
+
+
+def _cacheable(context, value):
+    '''
+    Return True if results for `value` are kept, because it is a datadef or
+    a top level variable of the template of `context`.
+    '''
+    # iterators can only be used once and views are created anew for every
+    # call, so they would fill the cache without ever being looked up again
+    if isinstance(value, (Iterator, KeysView, ValuesView, ItemsView)):
+        return False
+    return any(value is variable for variable in context.vars.values()) \
+        or any(value is variable for variable in context.parent.values())
+
+
+def _memo(context, value, key, compute):
+    '''
+    Return the result of `compute()` stored for `value` and the hashable
+    `key` in the cache of the render of `context`.
+    '''
+    if not _cacheable(context, value):
+        return compute()
+    cache = _caches.setdefault(context, dict())
+    try:
+        # the value is kept in the entry, so its id is not reused
+        return cache[id(value), key][1]
+    except KeyError:
+        pass
+    except TypeError:  # unhashable arguments
+        return compute()
+    result = compute()
+    cache[id(value), key] = (value, result)
+    return result
+
+
+def _call(func, context, value, args, kwargs):
+    '''
+    Call the builtin filter `func` with the context or environment it needs.
+    '''
+    passarg = getattr(func, 'jinja_pass_arg', None)  # jinja2 >= 3.0
+    if passarg is not None:
+        passarg = passarg.name
+    elif getattr(func, 'contextfilter', False):
+        passarg = 'context'
+    elif getattr(func, 'evalcontextfilter', False):
+        passarg = 'eval_context'
+    elif getattr(func, 'environmentfilter', False):
+        passarg = 'environment'
+    if passarg == 'context':
+        return func(context, value, *args, **kwargs)
+    if passarg == 'eval_context':
+        return func(context.eval_ctx, value, *args, **kwargs)
+    if passarg == 'environment':
+        return func(context.environment, value, *args, **kwargs)
+    return func(value, *args, **kwargs)
+
+
+def _memoizedbuiltin(name, fresh=list):
+    '''
+    Return a memoizing version of the builtin filter `name`. Cached results
+    are returned as a new object created by `fresh`, so that the cache
+    cannot be changed by the template.
+    '''
+    builtin = builtins.FILTERS[name]
+
+    @pass_context
+    def memoized(context, value, *args, **kwargs):
+        if not _cacheable(context, value):
+            return _call(builtin, context, value, args, kwargs)
+        return fresh(_memo(context, value, (name, args, tuple(sorted(kwargs.items()))),
+                           lambda: list(_call(builtin, context, value, args, kwargs))))
+    memoized.__name__ = memoized.__qualname__ = name
+    memoized.__doc__ = builtin.__doc__
+    return memoized
+
+
+groupby = _memoizedbuiltin('groupby')
+sort = _memoizedbuiltin('sort')
+_selectattr = _memoizedbuiltin('selectattr', fresh=iter)
+
+_equalitytests = ('equalto', 'eq', '==')
+
+
+def _index(context, value, attribute):
+    '''
+    Return a dict mapping the values of `attribute` to the lists of items
+    with that value, in the order of `value`.
+    '''
+    getter = builtins.make_attrgetter(context.environment, attribute)
+    index = dict()
+    for item in value:
+        index.setdefault(getter(item), list()).append(item)
+    return index
+
+
+@pass_context
+def selectattr(context, value, *args, **kwargs):
+    if len(args) == 3 and not kwargs and args[1] in _equalitytests \
+            and context.environment.tests.get(args[1]) is TESTS.get(args[1]) \
+            and _cacheable(context, value):
+        attribute, _, expected = args
+        try:
+            index = _memo(context, value, ('index', attribute),
+                          lambda: _index(context, value, attribute))
+            return iter(index.get(expected, ()))
+        except TypeError:  # unhashable attribute values
+            pass
+    return _selectattr(context, value, *args, **kwargs)
+
+selectattr.__doc__ = builtins.FILTERS['selectattr'].__doc__
+
+FILTERS = {
+    'groupby': groupby,
+    'sort': sort,
+    'selectattr': selectattr,
+}
+
+
+def memoize(func):
+    '''
+    Decorator for filters, which keeps the result of calls on datadefs and
+    top level variables for the rest of the render. Use it only for filters
+    without side effects, whose result depends only on their arguments.
+    '''
+    @pass_context
+    @wraps(func)
+    def memoized(context, value, *args, **kwargs):
+        return _memo(context, value, (func, args, tuple(sorted(kwargs.items()))),
+                     lambda: func(value, *args, **kwargs))
+    return memoized
@@ -0,0 +1,103 @@
+# encoding: utf8
+'''
+Proxy objects which load data files only when a template uses them.
+
+A `LazyData` object stands in for the data of one file. The file is loaded on
+the first access to the proxy, so data which is not used by the template is
+never parsed. All accessed top level keys are recorded, which shows which
+parts of a data file a template actually needs.
+
+For indexable formats like the binary format of `datareport.binary`, the
+loaded object is itself lazy, so only the accessed subtrees are decoded.
+
+The proxy reports the class of the loaded data as its `__class__`, so type
+checks like `isinstance(proxy, Mapping)`, the `mapping` test of jinja2 or the
+`tojson` filter treat it like the data it stands for. Such a check loads the
+data.
+'''
+import logging
+
+log = logging.getLogger()
+
+
+class LazyData(object):
+    # jinja2 looks up `data.name` as attribute first, so all attributes of the
+    # proxy itself start with an underscore to not hide keys of the data.
+
+    def __init__(self, name, load):
+        '''
+        Create a proxy for the data with given `name`, which is obtained by
+        calling `load()` on first use.
+        '''
+        self._name = name
+        self._load = load
+        self._data = None
+        self._loaded = False
+        self._touched = dict()
+
+    def _get(self):
+        if not self._loaded:
+            log.info("loading '%s' on first use...", self._name)
+            self._data = self._load()
+            self._loaded = True
+        return self._data
+
+    @property
+    def __class__(self):
+        return self._get().__class__
+
+    def __getattr__(self, attribute):
+        # only called for attributes which are not found on the proxy, e.g.
+        # dict methods like items(). Keys are looked up by jinja2 with
+        # __getitem__ if this raises an AttributeError.
+        if attribute.startswith('_'):
+            raise AttributeError(attribute)
+        return getattr(self._get(), attribute)
+
+    def __getitem__(self, key):
+        self._touched[key] = self._touched.get(key, 0) + 1
+        return self._get()[key]
+
+    def __contains__(self, key):
+        return key in self._get()
+
+    def __iter__(self):
+        return iter(self._get())
+
+    def __len__(self):
+        return len(self._get())
+
+    def __reversed__(self):
+        return reversed(self._get())
+
+    def __eq__(self, other):
+        if isinstance(other, LazyData):
+            other = other._get()
+        return self._get() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._get())
+
+    def __bool__(self):
+        return bool(self._get())
+
+    def __str__(self):
+        return str(self._get())
+
+    def __repr__(self):
+        return "LazyData(%r, loaded=%r)" % (self._name, self._loaded)
+
+
+def report(proxies):
+    '''
+    Log which of the given proxies were loaded and which keys were accessed.
+    '''
+    for proxy in proxies:
+        if not proxy._loaded:
+            log.info("'%s' was not used", proxy._name)
+        else:
+            log.info("'%s' was used, accessed keys: %s", proxy._name,
+                     ", ".join("%s (%dx)" % (key, count) for key, count in proxy._touched.items()))
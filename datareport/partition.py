@@ -0,0 +1,78 @@
+# encoding: utf8
+'''
+Parallel rendering of loops over independent records.
+
+The `partition` tag works like a `for` loop, but the body is rendered for
+chunks of the iterated items in a pool of processes:
+
+    {% partition entries in data.serial.items() | groupby("1.type") %}
+    ## Type {{ entries.grouper }}
+    ...
+    {% endpartition %}
+
+The pieces are joined in the original order, so the output is the same as
+with a serial render. The body must only depend on the current item and the
+template context: there is no `loop` variable, the loop target must be a
+single name and changes to namespaces inside the body are not visible
+outside of it.
+
+The number of processes is taken from the `partition_jobs` attribute of the
+environment, which is 1 by default, i.e. the body is rendered serially. The
+processes are forked, so everything in the context is available to them
+without being pickled; only the rendered text is sent back.
+'''
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+# the items and the body of the loop currently rendered in parallel, which
+# are inherited by the forked workers
+_partition = None
+
+
+def _renderchunk(bounds):
+    items, caller = _partition
+    start, stop = bounds
+    return "".join(caller(item) for item in items[start:stop])
+
+
+class PartitionExtension(Extension):
+    tags = set(['partition'])
+
+    def __init__(self, environment):
+        super(PartitionExtension, self).__init__(environment)
+        environment.extend(partition_jobs=1)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        target = parser.parse_assign_target(name_only=True)
+        target.set_ctx('param')
+        parser.stream.expect('name:in')
+        iterable = parser.parse_tuple(with_condexpr=False)
+        body = parser.parse_statements(('name:endpartition',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', [iterable]),
+                               [target], [], body).set_lineno(lineno)
+
+    def _render(self, iterable, caller):
+        global _partition
+        items = list(iterable)
+        jobs = self.environment.partition_jobs
+        if jobs > 1 and len(items) > 1:
+            import multiprocessing
+            # workers of a pool, e.g. in batch mode, cannot start processes
+            if multiprocessing.current_process().daemon \
+                    or 'fork' not in multiprocessing.get_all_start_methods():
+                jobs = 1
+        if jobs <= 1 or len(items) <= 1 or _partition is not None:
+            return Markup("".join(caller(item) for item in items))
+
+        # a few chunks per process even out records of different size
+        count = min(len(items), jobs * 4)
+        bounds = [(len(items) * i // count, len(items) * (i + 1) // count)
+                  for i in range(count)]
+        _partition = (items, caller)
+        try:
+            with multiprocessing.get_context('fork').Pool(jobs) as pool:
+                return Markup("".join(pool.map(_renderchunk, bounds)))
+        finally:
+            _partition = None
@@ -0,0 +1,128 @@
+# encoding: utf8
+'''
+Compact records for lists and dicts of same-shaped dicts.
+
+Every dict of a loaded data file carries a hash table of its own, which is
+most of the memory used by large files with many records of the same keys,
+like inventories or phone lists. If the validation rules of `verify`
+describe these records as `dictdescent` with a fixed set of keys, they can be
+stored as instances of a class with `__slots__` instead: the keys are kept
+once in the class and every record only stores its values.
+
+    >>> rules = {'type': 'list', 'values': {'type': 'dictdescent',
+    ...          'mandatory': ['Name'], 'allowed': ['Phone']}}
+    >>> people = compact([{'Name': 'Alice', 'Phone': '123'}, {'Name': 'Bob'}], rules)
+    >>> people[0]['Phone'], 'Phone' in people[1], dict(people[1])
+    ('123', False, {'Name': 'Bob'})
+
+Records are read-only mappings, so templates can use them like the dicts they
+replace, e.g. `person.Name`, `person['Name']` or `person.items()`.
+'''
+from collections.abc import Mapping
+
+
+class Record(Mapping):
+    '''
+    Base class of the record classes created by `recordclass()`. The value of
+    each key is stored in a slot, keys without value are missing.
+    '''
+    __slots__ = ()
+    _fields = ()
+    _slots = dict()
+
+    def __init__(self, data):
+        for key, value in data.items():
+            self._slots[key].__set__(self, value)
+
+    def __getitem__(self, key):
+        try:
+            return self._slots[key].__get__(self)
+        except (KeyError, AttributeError):
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        try:
+            self._slots[key].__get__(self)
+        except (KeyError, AttributeError, TypeError):
+            return False
+        return True
+
+    def __iter__(self):
+        for key in self._fields:
+            if key in self:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, dict(self))
+
+    def __reduce__(self):
+        return _restore, (self._fields, dict(self))
+
+
+def recordclass(fields, name='Record'):
+    '''
+    Return a new `Record` class for the given keys.
+    '''
+    fields = tuple(fields)
+    slotnames = tuple('_s%d' % i for i in range(len(fields)))
+    cls = type(name, (Record,), {'__slots__': slotnames, '_fields': fields,
+                               '__module__': __name__})
+    cls._slots = {key: getattr(cls, slot) for key, slot in zip(fields, slotnames)}
+    return cls
+
+
+_classes = dict()
+
+def _classfor(fields):
+    # one class per set of keys, which is also used to restore pickles
+    fields = tuple(fields)
+    if fields not in _classes:
+        _classes[fields] = recordclass(fields)
+    return _classes[fields]
+
+def _restore(fields, data):
+    return _classfor(fields)(data)
+
+
+def recordfields(rules):
+    '''
+    Return the keys of the records described by `rules`, if they are a
+    `dictdescent` rule with a fixed set of keys, otherwise None.
+    '''
+    if not isinstance(rules, dict) or rules.get('type') != 'dictdescent' \
+            or rules.get('others-allowed', False):
+        return None
+    fields = list()
+    for good in ['mandatory', 'allowed', 'deprecated']:
+        for key in rules.get(good, {}):
+            if key not in fields:
+                fields.append(key)
+    return fields or None
+
+
+def compact(data, rules):
+    '''
+    Return `data` with all lists and dicts whose values are described by a
+    `dictdescent` rule with fixed keys replaced by lists and dicts of
+    `Record` objects. The data must be valid according to the rules, see
+    `verify.Validator`. Containers which are not converted are returned
+    unchanged.
+    '''
+    if not isinstance(rules, dict) or 'values' not in rules:
+        return data
+    kind = rules.get('type')
+    if not (kind == 'list' and isinstance(data, list)
+            or kind == 'dict' and isinstance(data, dict)):
+        return data
+    fields = recordfields(rules['values'])
+    if fields is not None:
+        cls = _classfor(fields)
+        convert = lambda value: cls(value) if isinstance(value, dict) else value
+    else:
+        convert = lambda value: compact(value, rules['values'])
+    if kind == 'list':
+        return [convert(value) for value in data]
+    return {key: convert(value) for key, value in data.items()}
@@ -1,7 +1,9 @@
 #!/usr/bin/env python
 # encoding: utf8
 '''
-Usage: reporter [options] [-y|-p|-j] [--list=<name>...] [--filter=<pyfile>...] [--template=<template>] [--output=<file>] [<datadef>...]
+Usage: reporter convert [options] [-y|-p|-j] <datafile> <binaryfile>
+       reporter [options] [-y|-p|-j|-b] [--list=<name>...] [--filter=<pyfile>...] [--validation=<rules>...] [--template=<template>] [--output=<file>] [<datadef>...]
+       reporter [options] [-y|-p|-j|-b] [--filter=<pyfile>...] [--validation=<rules>...] --batch=<manifest>
 
    Create a report by filling the template with data according to <datadef>.
 
@@ -9,6 +11,53 @@ Usage: reporter [options] [-y|-p|-j] [--list=<name>...] [--filter=<pyfile>...] [
    identifier used in the template and <filename> is the YAML file containing
    the corresponding data.
 
+   The format of a single file can be given as "<key>:<format>=<filename>",
+   where <format> is one of yaml:<type>, libyaml, json, orjson, python,
+   binary, csv, tsv or jsonl. Files ending in .json, .drb (binary), .csv,
+   .tsv, .jsonl or .ndjson are recognized automatically, all other files are
+   loaded as given by the -y, -j, -p or -b option. The orjson format parses
+   JSON much faster with orjson, if it is installed, but reads integers
+   beyond 64 bits as floats; documents orjson rejects, e.g. with NaN, are
+   parsed with the json module. The libyaml format uses the fast C parser
+   of PyYAML, if it is installed. Note that PyYAML implements YAML 1.1, so
+   e.g. `yes` and `no` are read as booleans. The rows of CSV, TSV and JSON
+   Lines files are read each time the template iterates over them, without
+   keeping the whole table in memory. CSV and TSV rows are dicts with the
+   column names of the first line as keys. Rows can also be indexed and
+   sliced like a list, e.g. `rows[0]` or `rows | last`, which reads the file
+   up to the requested rows, or the whole file for negative indices and
+   `last`.
+
+   With --batch, all reports listed in the <manifest> file are created in one
+   run. The manifest is a YAML or JSON file with a list of jobs, e.g.
+
+      jobs:
+        - template: templates/AuthorList.md
+          output: output/AuthorList.md
+          datadefs: [list=data/authors.yaml]
+        - template: templates/PublicationsList.md
+          output: output/PublicationsList.md
+          list: [publications]
+          datadefs:
+            authors: data/authors.yaml
+            publications: [data/pub_2016.yaml, data/pub_2017.yaml]
+
+   Data files used by several jobs are loaded only once.
+
+   Loops over many independent records are rendered in the processes given
+   by the --jobs option, if they are written as `partition` instead of `for`:
+
+      {% partition entries in data.serial.items() | groupby("1.type") %}
+        ...
+      {% endpartition %}
+
+   The output is the same as with a serial render. The loop target must be a
+   single name and the body cannot use the `loop` variable.
+
+   With `convert`, the <datafile> is loaded and stored in <binaryfile> in a
+   compact binary format, which can be used with --binary. Binary files
+   named *.drb are recognized automatically.
+
 Options:
     -t, --template=<template>
         use an alternative template [default: report.md]
@@ -16,6 +65,10 @@ Options:
     --template-dir=<dir>
         specify the base directory for the used templates [default: .]
 
+    --template-cache=<dir>
+        store compiled templates in the given directory and reuse them as
+        long as the template and the set of filters do not change
+
     --list=<name>...
         all names given in --list options will be initialized as empty list and
         consecutive `datadef`s will be appended to the list instead of assigned
@@ -40,7 +93,8 @@ Options:
         use yaml.load (default)
 
     --yaml-loader=<type>
-        choose a specific loader type from the ruamel lib [default: safe]
+        choose a specific loader type from the ruamel lib, or "libyaml" for
+        the C implementation of PyYAML [default: safe]
 
     -j, --json
         use json.load instead of yaml.load
@@ -48,97 +102,747 @@ Options:
     -p, --python
         use eval() loading (very insecure!!!)
 
+    -b, --binary
+        load files in the binary format written by `reporter convert`. The
+        files are memory-mapped and only the parts used by the template are
+        decoded.
+
+    --lazy
+        load each data file only when the template uses it for the first
+        time. With --binary only the used parts of the files are decoded.
+        The data files which were used and their accessed keys are logged.
+
     -o, --output=<filename>
         write to this file instead of stdout
 
+    --deps=<file>
+        record the template with all its included templates, the filter
+        files, the data files and the options in the given file. The next
+        run with the same file only renders the report if any of these
+        changed, otherwise the output file is left untouched. Cannot be
+        used with --batch.
+
+    --buffer-size=<chars>
+        the output is written whenever at least this number of characters
+        has been rendered. Use 0 to write every rendered piece
+        immediately. [default: 65536]
+
+    --cache-dir=<dir>
+        keep parsed data files in a cache in the given directory. Unchanged
+        data files are then loaded from the cache instead of being parsed
+        again.
+
+    --cache-size=<MB>
+        maximum size of the data cache in megabytes [default: 1024]
+
+    -J, --jobs=<N>
+        parse the data files in N parallel processes. The order of entries
+        in --list names is kept as given on the command line. Loops marked
+        with the partition tag are rendered in N parallel processes, and in
+        batch mode also the reports. [default: 1]
+
+    --batch=<manifest>
+        render all reports defined in the given manifest file
+
     --filter=<pythonfile>
         load functions from given python file and add them to the available
         filters
 
+    --validation=<rules>
+        check the loaded data with the rules of the given YAML file, see
+        `verify`, and stop before rendering if it is invalid. Given as
+        "<key>=<rules>", only the data of the datadefs with this key is
+        checked, otherwise the data of all datadefs. The option can be given
+        more than once. Lazily loaded data is loaded completely for the
+        check.
+
+    --compact
+        store the records of lists and dicts, which the --validation rules
+        describe as dictdescent with a fixed set of keys, as compact objects
+        with slots instead of dicts. This saves most of the memory of files
+        with many records of the same shape. Templates can use the records
+        like dicts. Each file is converted with its first rule file.
+
+    --watch
+        render the report again whenever the template or a template it
+        includes, a filter file, a data file or a rule file of --validation
+        changes, until interrupted. The environment and the data are kept
+        in memory, so only the changed files are loaded again. Files are
+        loaded and rendered in this one process, so -J has no effect.
+        Cannot be used with --batch.
+
+    --profile=<file>
+        write the time of each phase of the run (loading the environment
+        with the filters, the template and the data, and rendering) and the
+        load time, size and number of objects of each data file as JSON to
+        the given file. Cannot be used with --batch.
+
+    --profile-blocks
+        additionally measure the time spent in each block and macro of the
+        templates
+
+    --profile-memory
+        additionally trace the peak memory of each phase (slow)
+
     -v, --verbose       increase output
     -h, --help          print this text
 '''
-from docopt import docopt
-
-from pprint import pformat
+# Only light modules are imported here. jinja2, ruamel and the other heavy
+# dependencies are imported by the functions using them, so that the reporter
+# starts quickly, e.g. for --help or with only JSON data files.
 import logging
-from ruamel.yaml import YAML
-from jinja2 import Environment, FileSystemLoader, select_autoescape
 import os.path
-import shlex
 import sys
 import datetime
+import time
+from contextlib import contextmanager
+from functools import partial
+from collections.abc import Sequence
+from itertools import islice, repeat
+try:
+    from datareport import lazy
+except ImportError:  # running as script from the source tree
+    import lazy
+
+def _sibling(name):
+    '''
+    Import the module `name` of the datareport package, also when running as
+    script from the source tree.
+    '''
+    import importlib
+    try:
+        return importlib.import_module('datareport.' + name)
+    except ImportError:
+        return importlib.import_module(name)
+
 log = logging.getLogger()
-logging.basicConfig(level=logging.INFO)
 
 def pythoneval(stream):
     return eval(stream.read())
 
+class RowStream(Sequence):
+    '''
+    Rows of a CSV, TSV or JSON Lines file. The file is read anew whenever the
+    rows are iterated, so a template loop over the rows never needs to keep
+    the whole table in memory. CSV and TSV rows are dicts with the names from
+    the header line as keys.
+
+    Rows can be indexed and sliced like a list, which reads the file up to the
+    requested rows. Negative indices also count the rows first, and
+    `reversed()`, e.g. for the `last` filter, reads all rows into memory.
+    '''
+    def __init__(self, filename, fileformat):
+        self.filename = filename
+        self.fileformat = fileformat
+
+    def __iter__(self):
+        with open(self.filename, 'r', newline='') as infile:
+            if self.fileformat == "jsonl":
+                import json
+                for line in infile:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                import csv
+                delimiter = "\t" if self.fileformat == "tsv" else ","
+                yield from csv.DictReader(infile, delimiter=delimiter)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if any(value is not None and value < 0
+                   for value in (index.start, index.stop, index.step)):
+                return list(self)[index]
+            return list(islice(self, index.start, index.stop, index.step))
+        if index < 0:
+            index += len(self)
+        if index >= 0:
+            for row in islice(self, index, None):
+                return row
+        raise IndexError("row index out of range")
+
+    def __reversed__(self):
+        return reversed(list(self))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return "RowStream(%r, %r)" % (self.filename, self.fileformat)
+
+# formats selected by the file extension, all other files are loaded with
+# the format chosen by the -y, -j, -p or -b option
+extensionformats = {
+    '.json': "json",
+    '.drb': "binary",
+    '.csv': "csv",
+    '.tsv': "tsv",
+    '.jsonl': "jsonl",
+    '.ndjson': "jsonl",
+}
+
+rowformats = ["csv", "tsv", "jsonl"]
+
+def orjsonload(stream):
+    '''
+    Parse JSON with orjson. Documents which orjson rejects, but the json
+    module accepts, like NaN or Infinity, are parsed with the json module.
+    '''
+    import json
+    text = stream.read()
+    try:
+        import orjson
+    except ImportError:
+        log.debug("orjson is not available, using json")
+        return json.loads(text)
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return json.loads(text)
+
+def getloader(loadertype):
+    '''
+    Return the load function for the given loader type, which is one of
+    "python", "json", "orjson", "libyaml" or "yaml:<type>" with a ruamel
+    loader type.
+
+    "orjson" and "libyaml" use the fast parsers of orjson and PyYAML if they
+    are installed and fall back to the json module and the ruamel safe loader
+    otherwise.
+    '''
+    if loadertype == "python":
+        return pythoneval
+    if loadertype == "json":
+        import json
+        return json.load
+    if loadertype == "orjson":
+        return orjsonload
+    from ruamel.yaml import YAML
+    if loadertype == "libyaml":
+        try:
+            import yaml
+            loader = yaml.CSafeLoader
+        except (ImportError, AttributeError):
+            log.debug("libyaml is not available, using ruamel safe loader")
+            return YAML(typ='safe').load
+        return lambda stream: yaml.load(stream, Loader=loader)
+    _, typ = loadertype.split(":", 1)
+    return YAML(typ=typ).load
+
+def loadfile(filename, loadertype, cache=None):
+    '''
+    Load the data file `filename` with the loader of given type, using the
+    `cache` if one is given. Binary files are never cached, since they are
+    loaded lazily anyway.
+    '''
+    if loadertype == "binary":
+        return _sibling('binary').load(filename)
+    if loadertype in rowformats:
+        return RowStream(filename, loadertype)
+    dataloader = getloader(loadertype)
+    if cache is not None:
+        return cache.load(filename, loadertype, dataloader)
+    with open(filename, 'r') as infile:
+        return dataloader(infile)
+
+@contextmanager
+def nophase(name):
+    yield
+
+def timedloadfile(filename, loadertype, cache=None):
+    '''
+    Like loadfile(), but returns a tuple of the data and the seconds it took
+    to load it.
+    '''
+    start = time.perf_counter()
+    data = loadfile(filename, loadertype, cache)
+    return data, time.perf_counter() - start
+
 def loadfilters(listoffiles):
+    '''
+    Load the filters defined in the given python files. The `memoize`
+    decorator of `datareport.filters` is available in the files without
+    import.
+    '''
     import importlib.util
+    memoize = _sibling('filters').memoize
     filters = dict()
     for filename in listoffiles:
         log.debug("loading filters from %s...", filename)
         spec = importlib.util.spec_from_file_location("loaded_filters", filename)
         assert spec, "Could not load python file %s" % filename
         newfilters = importlib.util.module_from_spec(spec)
+        newfilters.memoize = memoize
         spec.loader.exec_module(newfilters)
         for x in dir(newfilters):
-            if x.startswith('_'): continue
+            if x.startswith('_') or getattr(newfilters, x) is memoize: continue
             assert x not in filters
             filters[x] = getattr(newfilters, x)
             log.debug("   filter %s", x)
     return filters
 
-def main(cmdline = None):
-    if cmdline is None:
-        cmdline = sys.argv[1:]
-    else:
-        cmdline = shlex.split(cmdline)  # have a possibility for testing
-    args = docopt(__doc__, cmdline)
-
-    if args['--verbose']:
-        log.setLevel(logging.DEBUG)
-    log.debug(pformat(args))
-
-    log.debug("template directory '%s'", args['--template-dir'])
+def jsondefault(value):
+    '''
+    Convert the read-only mappings and sequences, which the binary format
+    and the proxies of --lazy use instead of dicts and lists, for the
+    `tojson` filter.
+    '''
+    from collections.abc import Mapping, Sequence
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, Sequence) and not isinstance(value, (str, bytes)):
+        return list(value)
+    raise TypeError("Object of type %s is not JSON serializable" % type(value).__name__)
+
+def makeenvironment(templatedir, filterfiles, templatecache=None):
+    '''
+    Create the jinja2 environment for templates in `templatedir` with the
+    filters defined in the python files `filterfiles`. If a `templatecache`
+    directory is given, compiled templates are stored there and reused.
+    '''
+    from jinja2 import Environment, FileSystemLoader
+    log.debug("template directory '%s'", templatedir)
     env = Environment(
-        loader=FileSystemLoader(args['--template-dir']),
+        loader=FileSystemLoader(templatedir),
         trim_blocks=True,
         lstrip_blocks=True,
         #autoescape=select_autoescape(['html', 'xml'])
         extensions=[
             'jinja2.ext.loopcontrols',
+            _sibling('partition').PartitionExtension,
         ],
     )
-    newfilters = loadfilters(args['--filter'])
+    env.policies['json.dumps_kwargs'] = dict(env.policies['json.dumps_kwargs'],
+                                             default=jsondefault)
+    # memoizing versions of groupby, sort and selectattr
+    env.filters.update(_sibling('filters').FILTERS)
+    newfilters = loadfilters(filterfiles)
     log.debug("new filters: %s", newfilters)
     env.filters.update(newfilters)
+    if templatecache is not None:
+        log.debug("using template cache in '%s'", templatecache)
+        TemplateCache = _sibling('templatecache').TemplateCache
+        env.bytecode_cache = TemplateCache(templatecache, env.filters.keys())
+    return env
+
+def loaddatafiles(sources, cache=None, jobs=1, profile=None):
+    '''
+    Load all data files given as (filename, loadertype) pairs and return a
+    dict mapping each pair to its data. Every file is loaded only once, even
+    if it is given several times. With `jobs` > 1 the files are parsed in
+    parallel processes. The load times are recorded in `profile`, if given.
+    '''
+    unique = list(dict.fromkeys(sources))
+    files = dict()
+    # binary and row files are opened lazily, so they are not worth a process
+    parse = [source for source in unique if source[1] not in ["binary"] + rowformats]
+    if jobs > 1 and len(parse) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        log.info("loading %d data files with %d jobs...", len(parse), jobs)
+        with ProcessPoolExecutor(jobs) as pool:
+            loaded = pool.map(timedloadfile, [filename for filename, _ in parse],
+                              [loadertype for _, loadertype in parse], repeat(cache))
+            for source, (data, seconds) in zip(parse, loaded):
+                files[source] = data
+                if profile is not None:
+                    profile.datafile(source[0], source[1], seconds, data)
+    for filename, loadertype in unique:
+        if (filename, loadertype) not in files:
+            log.info("loading '%s' as %s...", filename, loadertype)
+            data, seconds = timedloadfile(filename, loadertype, cache)
+            files[filename, loadertype] = data
+            if profile is not None:
+                profile.datafile(filename, loadertype, seconds, data)
+    return files
+
+def assigndata(datadefs, listnames, files):
+    '''
+    Build the template data from `datadefs`, a list of (key, filename,
+    loadertype) tuples, using the already loaded `files`. Keys in `listnames`
+    collect their data in a list in the given order, other keys are assigned.
+    '''
+    data = dict()
+    for dataid, datafilename, loadertype in datadefs:
+        if dataid in listnames:
+            log.debug("'%s' entry from '%s'", dataid, datafilename)
+            data.setdefault(dataid, list()).append(files[datafilename, loadertype])
+        else:
+            log.debug("'%s' from '%s'", dataid, datafilename)
+            data[dataid] = files[datafilename, loadertype]
+    return data
+
+def parsedatadefs(datadefs, loadertype):
+    '''
+    Split each datadef "<key>[:<format>]=<filename>" into a tuple (key,
+    filename, loadertype). Without explicit format, the loader is selected by
+    the file extension, or `loadertype` is used.
+    '''
+    result = list()
+    for datadef in datadefs:
+        dataid, datafilename = datadef.split("=", 1)
+        dataid, _, fileformat = dataid.partition(":")
+        if not fileformat:
+            extension = os.path.splitext(datafilename)[1].lower()
+            fileformat = extensionformats.get(extension, loadertype)
+        assert fileformat in ["python", "json", "orjson", "libyaml", "binary"] + rowformats \
+            or fileformat.startswith("yaml:"), \
+            "unknown format '%s' in datadef '%s'" % (fileformat, datadef)
+        result.append((dataid, datafilename, fileformat))
+    return result
+
+def plaindata(data):
+    '''
+    Return lazily loaded data as plain dicts and lists. Row files are read
+    completely and binary files are decoded completely.
+    '''
+    if isinstance(data, lazy.LazyData):
+        data = data._get()
+    if isinstance(data, RowStream):
+        return list(data)
+    binary = sys.modules.get('datareport.binary') or sys.modules.get('binary')
+    if binary is None:
+        return data
+    if isinstance(data, binary.LazyDict):
+        return {key: plaindata(value) for key, value in data.items()}
+    if isinstance(data, binary.LazyList):
+        return [plaindata(value) for value in data]
+    return data
+
+def parsevalidations(validations):
+    '''
+    Split the --validation options into a list of rule files for all data and
+    a dict mapping datadef keys to lists of rule files.
+    '''
+    import re
+    common = list()
+    bykey = dict()
+    for validation in validations:
+        match = re.match(r'(\w+)=(.*)$', validation)
+        if match:
+            bykey.setdefault(match.group(1), list()).append(match.group(2))
+        else:
+            common.append(validation)
+    return common, bykey
+
+def validatedata(validations, datadefs, files, compact=False):
+    '''
+    Check the loaded `files` of the `datadefs` with the rules given as
+    --validation options. Every file is checked once per rule file. Returns
+    True if all data is valid.
+
+    With `compact`, the records of each valid file are replaced in `files`
+    by compact objects, see `datareport.records`, using the rules of its
+    first rule file.
+    '''
+    Validator = _sibling('verify').Validator
+    common, bykey = parsevalidations(validations)
+    validators = dict()
+    checked = set()
+    compacted = set()
+    valid = True
+    for dataid, datafilename, loadertype in datadefs:
+        source = (datafilename, loadertype)
+        for rulefile in common + bykey.get(dataid, []):
+            if (source, rulefile) in checked:
+                continue
+            checked.add((source, rulefile))
+            if rulefile not in validators:
+                validators[rulefile] = Validator(rulefile=rulefile)
+            log.info("checking '%s' with '%s'...", datafilename, rulefile)
+            data = plaindata(files[source])
+            if not validators[rulefile].validate(data):
+                log.error("'%s' is invalid according to '%s'", datafilename, rulefile)
+                valid = False
+            elif compact and source not in compacted:
+                log.debug("storing records of '%s' as described in '%s'", datafilename, rulefile)
+                files[source] = _sibling('records').compact(data, validators[rulefile].rules)
+                compacted.add(source)
+    return valid
+
+def writereport(tmpl, data, outputname=None, buffersize=65536):
+    '''
+    Render the template with given data to the file `outputname`, or to
+    stdout if no name is given.
+
+    The output is streamed: rendered pieces are collected until at least
+    `buffersize` characters are pending and then written and flushed, so the
+    complete report never needs to be kept in memory.
+    '''
+    outfile = sys.stdout
+    if outputname is not None:
+        outfile = open(outputname, 'w')
+    log.info("writing output to %s", outfile.name)
+    # stdout is not closed, the watcher and the server render several reports
+    try:
+        pending = list()
+        size = 0
+        for chunk in tmpl.generate(**data):
+            pending.append(chunk)
+            size += len(chunk)
+            if size >= buffersize:
+                outfile.write("".join(pending))
+                outfile.flush()
+                pending = list()
+                size = 0
+        outfile.write("".join(pending))
+        outfile.flush()
+    finally:
+        if outfile is not sys.stdout:
+            outfile.close()
+
+def templatedependencies(env, name):
+    '''
+    Return a dict mapping the names of the template `name` and of all
+    templates it includes, imports or extends to the digests of their
+    sources. Returns None if a dependency cannot be determined, because its
+    name is only known while rendering.
+    '''
+    from jinja2 import meta
+    import hashlib
+    digests = dict()
+    pending = [name]
+    while pending:
+        current = pending.pop()
+        if current in digests:
+            continue
+        source, _, _ = env.loader.get_source(env, current)
+        digests[current] = hashlib.sha1(source.encode('utf8')).hexdigest()
+        for reference in meta.find_referenced_templates(env.parse(source)):
+            if reference is None:
+                log.debug("template '%s' has dynamic dependencies", current)
+                return None
+            pending.append(reference)
+    return digests
+
+# options which do not change the content of the report
+_volatileoptions = ['--verbose', '--jobs', '--buffer-size', '--cache-dir',
+                    '--cache-size', '--template-cache', '--deps']
+
+def dependencies(args, env):
+    '''
+    Return a description of everything the report defined by `args` depends
+    on: the options, the digests of the template and its dependencies, of
+    the filter files and of the data files. Returns None if the dependencies
+    cannot be determined completely.
+    '''
+    templates = templatedependencies(env, args['--template'])
+    if templates is None:
+        return None
+    filedigest = _sibling('datacache').filedigest
+    datafiles = [datadef.split("=", 1)[1] for datadef in args['<datadef>']]
+    common, bykey = parsevalidations(args['--validation'])
+    rulefiles = common + [rulefile for rules in bykey.values() for rulefile in rules]
+    return {
+        'options': {key: value for key, value in args.items()
+                    if key not in _volatileoptions},
+        'templates': templates,
+        'filters': {filename: filedigest(filename) for filename in args['--filter']},
+        'data': {filename: filedigest(filename) for filename in dict.fromkeys(datafiles)},
+        'validation': {filename: filedigest(filename) for filename in dict.fromkeys(rulefiles)},
+    }
 
-    # load template
-    log.info("loading template '%s'...", args['--template'])
-    tmpl = env.get_template(args['--template'])
+def readmanifest(filename, loadertype):
+    '''
+    Read a batch manifest in YAML or JSON format. The manifest contains a list
+    of jobs, either at top level or under the key `jobs`. Each job is a dict
+    with the keys `output`, `template` (optional, defaults to the --template
+    option), `list` (optional list of names) and `datadefs` (list of
+    "<key>=<filename>" strings, or dict mapping keys to filenames or lists of
+    filenames).
+
+    Returns a list of jobs as (template, output, listnames, datadefs) tuples,
+    with datadefs as returned by `parsedatadefs()`.
+    '''
+    from ruamel.yaml import YAML
+    with open(filename, 'r') as infile:
+        manifest = YAML(typ='safe').load(infile)
+    if isinstance(manifest, dict):
+        manifest = manifest.get('jobs')
+    assert isinstance(manifest, list), "manifest %s must contain a list of jobs" % filename
+    jobs = list()
+    for job in manifest:
+        assert 'output' in job, "job without output in manifest %s: %s" % (filename, job)
+        datadefs = job.get('datadefs', list())
+        if isinstance(datadefs, dict):
+            datadefs = ["%s=%s" % (key, datafilename)
+                        for key, value in datadefs.items()
+                        for datafilename in (value if isinstance(value, list) else [value])]
+        datadefs = parsedatadefs(datadefs, loadertype)
+        jobs.append((job.get('template'), job['output'], job.get('list', list()), datadefs))
+    return jobs
+
+_batch = None
+
+def _renderbatchjob(index):
+    env, jobs, files, metadict, buffersize = _batch
+    template, output, listnames, datadefs = jobs[index]
+    data = assigndata(datadefs, listnames, files)
+    if metadict in data:
+        raise ValueError("metadata dictionary '%s' has same name as loaded data in job for %s" % (metadict, output))
+    data[metadict] = {
+        "time": datetime.datetime.now(),
+    }
+    log.info("rendering '%s' to '%s'...", template, output)
+    writereport(env.get_template(template), data, output, buffersize)
+    return output
+
+def batch(args, env, loadertype, cache):
+    '''
+    Render all jobs of the manifest given in `--batch` using one environment.
+    Every data file is loaded only once for all jobs.
+    '''
+    global _batch
+    jobs = [(template or args['--template'], output, listnames, datadefs)
+            for template, output, listnames, datadefs in readmanifest(args['--batch'], loadertype)]
+    sources = [(datafilename, filetype) for job in jobs for _, datafilename, filetype in job[3]]
+    files = loaddatafiles(sources, cache, int(args['--jobs']))
+    log.debug("loading data complete.")
+    if args['--validation'] and not validatedata(args['--validation'],
+                                                 [datadef for job in jobs for datadef in job[3]],
+                                                 files, args['--compact']):
+        return 1
+
+    # compile all templates before rendering, so forked workers share them
+    for template in dict.fromkeys(job[0] for job in jobs):
+        log.info("loading template '%s'...", template)
+        env.get_template(template)
+
+    _batch = (env, jobs, files, args['--meta-dict'], int(args['--buffer-size']))
+    workers = int(args['--jobs'])
+    import multiprocessing
+    try:
+        if workers > 1 and len(jobs) > 1 and 'fork' in multiprocessing.get_all_start_methods():
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                pool.map(_renderbatchjob, range(len(jobs)))
+        else:
+            for index in range(len(jobs)):
+                _renderbatchjob(index)
+    except ValueError as e:
+        log.error("%s", e)
+        return 1
+    finally:
+        _batch = None
+    return 0
+
+def main(cmdline = None, session = None):
+    '''
+    Run the reporter with the arguments in `cmdline`, a string or a list of
+    arguments, or with sys.argv. A `session` of `datareport.server` provides
+    environments and data kept in memory between runs.
+    '''
+    from docopt import docopt
+    import shlex
+    logging.basicConfig(level=logging.INFO)
+    if cmdline is None:
+        cmdline = sys.argv[1:]
+    elif isinstance(cmdline, str):
+        cmdline = shlex.split(cmdline)  # have a possibility for testing
+    args = docopt(__doc__, cmdline)
+    if session is not None:
+        # the data is kept in memory by the server, so it is parsed only once
+        args['--jobs'] = '1'
 
-    yamlin = YAML(typ=args['--yaml-loader'])
-    dataloader = yamlin.load
-    if args['--yaml']: dataloader = yamlin.load
-    if args['--python']: dataloader = pythoneval
-    if args['--json']:
+    if args['--verbose']:
+        log.setLevel(logging.DEBUG)
+        from pprint import pformat
+        log.debug(pformat(args))
+
+    if args['--watch'] and session is None:
+        if args['convert'] or args['--batch'] is not None:
+            log.error("--watch cannot be used with convert or --batch")
+            return 1
+        if int(args['--jobs']) > 1:
+            log.warning("--jobs is ignored with --watch, the data is kept in this process")
+        return _sibling('watch').run(cmdline, args)
+
+    if args['--batch'] is not None:
+        # the profile and the dependencies describe a single report
+        unsupported = [option for option in ['--profile', '--profile-blocks',
+                                             '--profile-memory', '--deps']
+                       if args[option] not in (None, False)]
+        if unsupported:
+            log.error("%s cannot be used with --batch", ", ".join(unsupported))
+            return 1
+
+    loadertype = "yaml:%s" % args['--yaml-loader']
+    if args['--yaml-loader'] == "libyaml": loadertype = "libyaml"
+    if args['--python']: loadertype = "python"
+    if args['--json']: loadertype = "json"
+    if args['--binary']: loadertype = "binary"
+
+    if args['convert']:
+        log.info("converting '%s' to '%s'...", args['<datafile>'], args['<binaryfile>'])
+        _sibling('binary').dump(loadfile(args['<datafile>'], loadertype), args['<binaryfile>'])
+        return 0
+
+    profile = None
+    phase = nophase
+    if args['--profile'] is not None:
+        profile = _sibling('timing').Profile(memory=args['--profile-memory'])
+        phase = profile.phase
+
+    with phase("environment"):
+        if session is not None:
+            env = session.environment(args['--template-dir'], args['--filter'],
+                                      args['--template-cache'])
+        else:
+            env = makeenvironment(args['--template-dir'], args['--filter'],
+                                  args['--template-cache'])
+        env.partition_jobs = int(args['--jobs'])
+
+    cache = None
+    if args['--cache-dir'] is not None:
+        log.debug("using data cache in '%s'", args['--cache-dir'])
+        cache = _sibling('datacache').DataCache(args['--cache-dir'],
+                          maxsize=int(float(args['--cache-size']) * 1024 * 1024))
+    if session is not None:
+        cache = session.datacache(cache)
+
+    if args['--batch'] is not None:
+        return batch(args, env, loadertype, cache)
+
+    deps = None
+    if args['--deps'] is not None:
         import json
-        dataloader = json.load
+        deps = dependencies(args, env)
+        try:
+            with open(args['--deps'], 'r') as infile:
+                olddeps = json.load(infile)
+        except (OSError, ValueError):
+            olddeps = None
+        if deps is not None and deps == olddeps and args['--output'] is not None \
+                and os.path.exists(args['--output']):
+            log.info("'%s' is up to date", args['--output'])
+            return 0
+        # written again after the report was rendered successfully, so a
+        # failed render is not taken as up to date by the next run
+        if olddeps is not None:
+            os.remove(args['--deps'])
+
+    # load template
+    log.info("loading template '%s'...", args['--template'])
+    with phase("template"):
+        tmpl = env.get_template(args['--template'])
+        if profile is not None and args['--profile-blocks']:
+            timed = [env.get_template(name) for name in
+                     templatedependencies(env, args['--template']) or [args['--template']]]
 
     # load data
-    data = dict()
-    for datadef in args['<datadef>']:
-        dataid, datafilename = datadef.split("=", 1)
-        if dataid in args['--list']:
-            log.info("loading '%s' entry from '%s'...", dataid, datafilename)
-            data.setdefault(dataid, list()).append(dataloader(open(datafilename, 'r')))
-        else:
-            log.info("loading '%s' from '%s'...", dataid, datafilename)
-            data[dataid] = dataloader(open(datafilename, 'r'))
+    datadefs = parsedatadefs(args['<datadef>'], loadertype)
+    sources = [(datafilename, filetype) for _, datafilename, filetype in datadefs]
+    if args['--lazy']:
+        files = {(filename, filetype): lazy.LazyData(filename, partial(loadfile, filename, filetype, cache))
+                 for filename, filetype in sources}
+    else:
+        with phase("data"):
+            files = loaddatafiles(sources, cache, int(args['--jobs']), profile)
     log.debug("loading data complete.")
 
+    if args['--validation']:
+        with phase("validation"):
+            if not validatedata(args['--validation'], datadefs, files, args['--compact']):
+                return 1
+    data = assigndata(datadefs, args['--list'], files)
+
     if args['--meta-dict'] in data:
         log.error("metadata dictionary has same name as loaded data! use '--meta-dict' to rename, or change datadef")
         return 1
@@ -148,12 +852,21 @@ def main(cmdline = None):
     }
 
     # output result
-    ostream = sys.stdout
-    if args['--output'] is not None:
-        ostream = open(args['--output'], 'w')
-    log.info("writing output to %s", ostream.name)
-    with ostream as outfile:
-        outfile.write(tmpl.render(**data))
+    with phase("render"):
+        if profile is not None and args['--profile-blocks']:
+            with profile.blocktiming(timed), profile.macrotiming():
+                writereport(tmpl, data, args['--output'], int(args['--buffer-size']))
+        else:
+            writereport(tmpl, data, args['--output'], int(args['--buffer-size']))
+    if args['--lazy']:
+        lazy.report(files.values())
+
+    if deps is not None:
+        with open(args['--deps'], 'w') as outfile:
+            json.dump(deps, outfile, indent=1, sort_keys=True)
+
+    if profile is not None:
+        profile.write(args['--profile'])
 
     return 0
 
@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+# encoding: utf8
+'''
+Usage: server [options]
+       server [options] --stop
+
+   Run the reporter as a server listening on a unix socket.
+
+   Starting the reporter for every report takes much longer than rendering a
+   small report, since python has to import jinja2 and ruamel, the template
+   environment with its filters has to be created and the data files have to
+   be parsed. The server does all this once and keeps the environments,
+   compiled templates and parsed data files in memory. Reports are requested
+   with `reporter-client`, which takes the same arguments as `reporter`.
+
+   Everything kept in memory is checked for changes on every request:
+   templates are reloaded by jinja2 when they change, environments are
+   created anew when a filter file changed and data files are parsed again
+   when their size or modification time changed. Parsed data files are
+   kept until the total size of the files exceeds --memory-size, then the
+   least recently used ones are dropped.
+
+   Requests are handled one after the other in the working directory of the
+   client. The --jobs and --watch options of the reporter are ignored by the
+   server.
+
+Options:
+    --socket=<path>
+        the unix socket to listen on. The default is taken from the
+        environment variable DATAREPORT_SOCKET, or is datareport-<uid>.sock
+        in $XDG_RUNTIME_DIR or the temporary directory.
+
+    --memory-size=<MB>
+        maximum total size in megabytes of the data files kept in memory.
+        Parsed data takes several times the size of its file. [default: 256]
+
+    --stop          stop the server listening on the socket
+    -v, --verbose   increase output
+    -h, --help      print this text
+'''
+from docopt import docopt
+
+from collections import OrderedDict
+import contextlib
+import json
+import logging
+import os
+import shlex
+import socketserver
+import sys
+import traceback
+try:
+    from datareport import reporter
+    from datareport.client import socketpath, connect, request
+except ImportError:  # running as script from the source tree
+    import reporter
+    from client import socketpath, connect, request
+
+log = logging.getLogger()
+
+# maximum total size in bytes of the data files kept in memory by default
+MEMORY_SIZE = 256 * 1024 * 1024
+
+
+def filestate(filename):
+    '''
+    Return size and modification time of a file, or None if it is missing.
+    '''
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class MemoryCache(object):
+    '''
+    Keeps parsed data files in memory. It has the interface of
+    `datareport.datacache.DataCache`, so it can be used as cache of
+    `reporter.loadfile()`. Files which are not in memory or which changed are
+    loaded through the `fallback` cache, if one is given. The least recently
+    used files are forgotten when the total size of the files is above
+    `maxsize` bytes.
+    '''
+    def __init__(self, maxsize=MEMORY_SIZE):
+        self.entries = OrderedDict()
+        self.fallback = None
+        self.maxsize = maxsize
+
+    def load(self, filename, loadertype, loader):
+        key = (os.path.abspath(filename), loadertype)
+        state = filestate(filename)
+        if key in self.entries and self.entries[key][0] == state:
+            log.debug("'%s' (%s) is in memory", filename, loadertype)
+            self.entries.move_to_end(key)
+            return self.entries[key][1]
+        if self.fallback is not None:
+            data = self.fallback.load(filename, loadertype, loader)
+        else:
+            with open(filename, 'r') as infile:
+                data = loader(infile)
+        self.entries[key] = (state, data)
+        self.entries.move_to_end(key)
+        self.evict()
+        return data
+
+    def evict(self):
+        '''
+        Forget the least recently used files until the total size of the
+        files is below the configured maximum.
+        '''
+        total = sum(state[0] for state, _ in self.entries.values() if state is not None)
+        while total > self.maxsize:
+            key, (state, _) = self.entries.popitem(last=False)
+            log.debug("dropping '%s' (%s) from memory", key[0], key[1])
+            total -= state[0] if state is not None else 0
+
+    def prune(self):
+        '''
+        Forget all files which were removed or changed.
+        '''
+        for key, (state, _) in list(self.entries.items()):
+            if filestate(key[0]) != state:
+                del self.entries[key]
+
+
+class Session(object):
+    '''
+    The state kept by the server between requests: the template
+    environments and at most `memorysize` bytes of data files.
+    '''
+    def __init__(self, memorysize=MEMORY_SIZE):
+        self.environments = dict()
+        self.cache = MemoryCache(memorysize)
+
+    def environment(self, templatedir, filterfiles, templatecache=None):
+        '''
+        Return the environment created by `reporter.makeenvironment()` with
+        the given arguments. It is created again if a filter file changed.
+        '''
+        key = (os.path.abspath(templatedir),
+               tuple(os.path.abspath(filename) for filename in filterfiles),
+               templatecache)
+        state = [filestate(filename) for filename in filterfiles]
+        if key in self.environments and self.environments[key][0] == state:
+            return self.environments[key][1]
+        log.info("creating environment for '%s'", templatedir)
+        env = reporter.makeenvironment(templatedir, filterfiles, templatecache)
+        self.environments[key] = (state, env)
+        return env
+
+    def datacache(self, cache=None):
+        '''
+        Return the in-memory cache, which loads files through the on-disk
+        `cache` if given.
+        '''
+        self.cache.fallback = cache
+        self.cache.prune()
+        return self.cache
+
+
+class ClientStream(object):
+    '''
+    File-like object sending everything written to it to the client as
+    messages of the given kind.
+    '''
+    def __init__(self, connection, kind):
+        self.connection = connection
+        self.kind = kind
+        self.name = '<client %s>' % kind
+
+    def write(self, text):
+        if text:
+            send(self.connection, {self.kind: text})
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+def send(connection, message):
+    connection.sendall(json.dumps(message).encode('utf8') + b'\n')
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        message = json.loads(self.rfile.readline().decode('utf8'))
+        if message.get('stop'):
+            log.info("stopping server")
+            send(self.connection, {'exit': 0})
+            self.server.stopping = True
+            return
+        log.info("request in '%s': %s", message['cwd'],
+                 " ".join(shlex.quote(arg) for arg in message['argv']))
+        send(self.connection, {'exit': self.render(message['cwd'], message['argv'])})
+
+    def render(self, cwd, argv):
+        '''
+        Run the reporter with arguments `argv` in directory `cwd`. Its output
+        and log messages are sent to the client.
+        '''
+        stderr = ClientStream(self.connection, 'stderr')
+        handler = logging.StreamHandler(stderr)
+        handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+        # the reporter logs at level INFO, or DEBUG with --verbose
+        level = log.level
+        log.setLevel(logging.INFO)
+        log.addHandler(handler)
+        olddir = os.getcwd()
+        try:
+            os.chdir(cwd)
+            with contextlib.redirect_stdout(ClientStream(self.connection, 'stdout')):
+                return reporter.main(argv, session=self.server.session)
+        except SystemExit as e:
+            # docopt exits for --help and usage errors
+            if isinstance(e.code, str):
+                stderr.write(e.code + "\n")
+                return 1
+            return e.code or 0
+        except Exception:
+            stderr.write(traceback.format_exc())
+            return 1
+        finally:
+            os.chdir(olddir)
+            log.removeHandler(handler)
+            log.setLevel(level)
+
+
+class Server(socketserver.UnixStreamServer):
+    def __init__(self, path, memorysize=MEMORY_SIZE):
+        if os.path.exists(path):
+            os.unlink(path)
+        socketserver.UnixStreamServer.__init__(self, path, RequestHandler)
+        self.session = Session(memorysize)
+        self.stopping = False
+
+    def serve(self):
+        try:
+            while not self.stopping:
+                self.handle_request()
+        finally:
+            self.server_close()
+            os.unlink(self.server_address)
+
+
+def main(cmdline=None):
+    if cmdline is not None:
+        cmdline = shlex.split(cmdline)
+    args = docopt(__doc__, cmdline)
+    logging.basicConfig(level=logging.INFO)
+
+    if args['--verbose']:
+        log.setLevel(logging.DEBUG)
+
+    path = args['--socket'] or socketpath()
+    if args['--stop']:
+        connection = connect(path)
+        if connection is None:
+            log.error("no server is listening on %s", path)
+            return 1
+        return request(connection, {'stop': True})
+
+    connection = connect(path)
+    if connection is not None:
+        connection.close()
+        log.error("a server is already listening on %s", path)
+        return 1
+    log.info("listening on %s", path)
+    Server(path, int(float(args['--memory-size']) * 1024 * 1024)).serve()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,27 @@
+# encoding: utf8
+'''
+Bytecode cache for compiled templates.
+
+This is a module of its own, so that jinja2 is only imported by the reporter
+when a template environment is created.
+'''
+from jinja2 import FileSystemBytecodeCache
+import hashlib
+import os
+
+
+class TemplateCache(FileSystemBytecodeCache):
+    '''
+    Bytecode cache for compiled templates. Jinja2 already invalidates the
+    entries when the template source changes. Since compiled templates also
+    depend on the available filters, the names of all filters are added to the
+    cache key.
+    '''
+    def __init__(self, directory, filternames):
+        os.makedirs(directory, exist_ok=True)
+        super(TemplateCache, self).__init__(directory)
+        self.fingerprint = "\0".join(sorted(filternames))
+
+    def get_cache_key(self, name, filename=None):
+        key = super(TemplateCache, self).get_cache_key(name, filename)
+        return hashlib.sha1((key + "\0" + self.fingerprint).encode('utf8')).hexdigest()
@@ -0,0 +1,170 @@
+# encoding: utf8
+'''
+Timing instrumentation for the phases of a reporter run.
+
+A `Profile` collects the duration of the phases of a run, the load time,
+size and number of objects of every data file and optionally the time spent
+in the blocks and macros of the templates and the peak memory of each phase.
+The result is written as JSON, so it can be processed by other tools.
+'''
+from contextlib import contextmanager
+import json
+import logging
+import os
+import time
+
+log = logging.getLogger()
+
+
+def countobjects(data):
+    '''
+    Count all objects in nested dicts and lists, including the containers.
+    Returns None for other containers, e.g. lazily loaded data, which would
+    have to be loaded completely for counting.
+    '''
+    count = 0
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        count += 1
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+        elif not isinstance(item, (str, bytes, int, float)) and hasattr(item, '__iter__'):
+            return None
+    return count
+
+
+class Profile(object):
+    def __init__(self, memory=False):
+        '''
+        Start profiling. If `memory` is True, the peak memory of every phase
+        is traced with tracemalloc, which slows down the run considerably.
+        '''
+        self.memory = memory
+        self.start = time.perf_counter()
+        self.phases = list()
+        self.datafiles = list()
+        self.blocks = dict()
+        self.macros = dict()
+        if memory:
+            import tracemalloc
+            tracemalloc.start()
+
+    @contextmanager
+    def phase(self, name):
+        '''
+        Context manager measuring the phase with given name.
+        '''
+        if self.memory:
+            import tracemalloc
+            if hasattr(tracemalloc, 'reset_peak'):  # python >= 3.9
+                tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = {'name': name, 'seconds': time.perf_counter() - start}
+            if self.memory:
+                entry['peak_memory'] = tracemalloc.get_traced_memory()[1]
+            self.phases.append(entry)
+
+    def datafile(self, filename, fileformat, seconds, data):
+        '''
+        Record that loading `filename` took given number of seconds.
+        '''
+        self.datafiles.append({
+            'filename': filename,
+            'format': fileformat,
+            'bytes': os.path.getsize(filename),
+            'seconds': seconds,
+            'objects': countobjects(data),
+        })
+
+    def _add(self, table, name, seconds):
+        entry = table.setdefault(name, {'calls': 0, 'seconds': 0.0})
+        entry['calls'] += 1
+        entry['seconds'] += seconds
+
+    @contextmanager
+    def blocktiming(self, templates):
+        '''
+        Context manager measuring the time spent in every block of the given
+        templates. Since blocks are rendered lazily, only the time spent
+        inside the block is counted. Nested blocks are included in the time
+        of the enclosing block. The blocks are restored afterwards, since the
+        templates are cached by their environment, e.g. by the server.
+        '''
+        originals = [(template, dict(template.blocks)) for template in templates]
+        for template, blocks in originals:
+            for name, render in blocks.items():
+                template.blocks[name] = self._timedblock(name, render)
+        try:
+            yield
+        finally:
+            for template, blocks in originals:
+                template.blocks.update(blocks)
+
+    def _timedblock(self, name, render):
+        def timedrender(context):
+            seconds = 0.0
+            generator = render(context)
+            try:
+                while True:
+                    start = time.perf_counter()
+                    try:
+                        chunk = next(generator)
+                    except StopIteration:
+                        return
+                    finally:
+                        seconds += time.perf_counter() - start
+                    yield chunk
+            finally:
+                self._add(self.blocks, name, seconds)
+        return timedrender
+
+    @contextmanager
+    def macrotiming(self):
+        '''
+        Context manager measuring the time spent in every macro call, by
+        name of the macro.
+        '''
+        from jinja2.runtime import Macro
+        invoke = Macro._invoke
+        profile = self
+        def timedinvoke(self, arguments, autoescape):
+            start = time.perf_counter()
+            try:
+                return invoke(self, arguments, autoescape)
+            finally:
+                profile._add(profile.macros, self.name, time.perf_counter() - start)
+        Macro._invoke = timedinvoke
+        try:
+            yield
+        finally:
+            Macro._invoke = invoke
+
+    def result(self):
+        result = {
+            'total_seconds': time.perf_counter() - self.start,
+            'phases': self.phases,
+            'datafiles': self.datafiles,
+        }
+        if self.blocks or self.macros:
+            result['blocks'] = self.blocks
+            result['macros'] = self.macros
+        if self.memory:
+            import tracemalloc
+            result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return result
+
+    def write(self, filename):
+        '''
+        Write the profile as JSON to the file with given name.
+        '''
+        log.info("writing profile to %s", filename)
+        with open(filename, 'w') as outfile:
+            json.dump(self.result(), outfile, indent=1)
@@ -1,24 +1,59 @@
 #!/usr/bin/env python
 # encoding: utf8
 '''
-Usage: verify [options] <filename>
+Usage: verify [options] <filename>...
+
+   Validate the given files, which may also be glob patterns, against the
+   rules. The exit status is 0 if all files are valid and 1 otherwise.
 
 Options:
     --validation=<rules>
         validation definition file in YAML format
         [default: verify.yaml]
 
+    -s, --stream
+        validate the file record by record without loading it completely.
+        Each document of a YAML stream is a record. If the rules are of type
+        'list', documents which are sequences are split further into their
+        elements, which are checked against its 'values'. Files ending in
+        .jsonl or .ndjson are read as JSON Lines with one record per line.
+        Every invalid record is reported.
+
+    -a, --all
+        check the complete data and report all violations of the rules
+        instead of stopping at the first one
+
+    --state=<file>
+        validate incrementally: the digests of all valid elements of the top
+        level list or dict of each file are stored in the given file, and
+        only new or changed elements are checked in the next run with the
+        same rules. This mode does not use --stream, --all or --jobs.
+
+    -J, --jobs=<N>
+        validate in N parallel processes. Files are distributed over the
+        processes, or the elements of the top level list or dict if there
+        are fewer files than processes. [default: 1]
+
     -h, --help      print this help text
     -v, --verbose   give more details about the processing
 '''
 
-from docopt import docopt
+from itertools import repeat
 import logging
-from ruamel import yaml
+import os
+import operator
 import re
+import sys
 
 log = logging.getLogger()
-logging.basicConfig(level=100) #logging.INFO)
+
+def loadyaml(stream):
+    '''
+    Load a YAML document with the ruamel safe loader. ruamel is imported on
+    first use, so the command line starts quickly, e.g. for --help.
+    '''
+    from ruamel.yaml import YAML
+    return YAML(typ='safe').load(stream)
 
 def check(condition, warning_if_false, level=logging.WARNING):
     log.debug("check for '%s'", warning_if_false)
@@ -27,6 +62,109 @@ def check(condition, warning_if_false, level=logging.WARNING):
             raise AssertionError(warning_if_false)
         log.log(level, warning_if_false)
 
+def pathstr(parent, name):
+    '''
+    Return the colon separated path of an item with given `name`, where
+    `parent` is the path of its container as linked `(parent, name)` tuple, or
+    None. Validators keep paths in this form, so that the string is only built
+    when it is needed for a message.
+
+    >>> pathstr(((None, '/'), 'serial'), 42)
+    '/:serial:42'
+    '''
+    names = [str(name)]
+    while parent is not None:
+        parent, name = parent
+        names.append(str(name))
+    return ":".join(reversed(names))
+
+class BrokenRecord(object):
+    '''
+    Yielded by `iterrecords()` in place of a record which cannot be parsed,
+    with the message of the parser.
+    '''
+    def __init__(self, message):
+        self.message = message
+
+def iterrecords(filename, split=True):
+    '''
+    Iterate over the records in the file with given name without loading the
+    whole file. Yields `(path, element, record)` tuples, where `path` is the
+    list of names leading to the record and `element` tells if the record is
+    an element of a sequence.
+
+    YAML files are read as stream of documents. If `split` is set, a document
+    which is a sequence yields its elements one by one, otherwise and for
+    other documents the complete document is yielded. Files ending in `.jsonl` or `.ndjson` are read as JSON Lines,
+    where every non-empty line is an element. Lines which are not valid JSON
+    are yielded as `BrokenRecord`.
+    '''
+    if filename.endswith(('.jsonl', '.ndjson')):
+        import json
+        with open(filename, 'r') as infile:
+            for lineno, line in enumerate(infile, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    record = BrokenRecord("invalid JSON: %s" % e)
+                yield ['/', str(lineno)], True, record
+        return
+
+    from ruamel.yaml import YAML
+    from ruamel.yaml.events import SequenceStartEvent, SequenceEndEvent, StreamEndEvent
+    with open(filename, 'r') as infile:
+        # events are read from the parser and composed by the composer of
+        # the pure python implementation, which share the same parser; with
+        # the C parser of ruamel.yaml.clib they would read the stream twice
+        yaml = YAML(typ='safe', pure=True)
+        constructor, parser = yaml.get_constructor_parser(infile)
+        composer = yaml.composer
+        parser.get_event()  # stream start
+        document = 0
+        while not parser.check_event(StreamEndEvent):
+            parser.get_event()  # document start
+            if split and parser.check_event(SequenceStartEvent):
+                parser.get_event()
+                index = 0
+                while not parser.check_event(SequenceEndEvent):
+                    node = composer.compose_node(None, None)
+                    yield ['/', str(document), str(index)], True, constructor.construct_document(node)
+                    index += 1
+                parser.get_event()
+            else:
+                node = composer.compose_node(None, None)
+                yield ['/', str(document)], False, constructor.construct_document(node)
+            parser.get_event()  # document end
+            composer.anchors = dict()
+            document += 1
+
+class Violation(object):
+    '''
+    A violated `rule` by the `value` at path (`parent`, `name`). The path and
+    the message are only formatted when they are requested.
+    '''
+    __slots__ = ('parent', 'name', 'rule', 'value', 'message', 'values')
+
+    def __init__(self, parent, name, rule, value, message, *values):
+        self.parent = parent
+        self.name = name
+        self.rule = rule
+        self.value = value
+        self.message = message
+        self.values = values
+
+    @property
+    def path(self):
+        return pathstr(self.parent, self.name)
+
+    def __str__(self):
+        return self.message % ((self.path,) + self.values)
+
+    def __repr__(self):
+        return "Violation(%r, %r)" % (self.path, str(self))
+
 class Validator(object):
     def __init__(self, rulefile=None, rules=None, throw=False):
         '''
@@ -38,10 +176,11 @@ class Validator(object):
         '''
         self.throw = throw
         self.rules = rules
+        self._compiled = dict()
         if rulefile is not None:
             log.debug("opening %s...", rulefile)
             with open(rulefile, 'r') as infile:
-                self.rules = yaml.safe_load(infile)
+                self.rules = loadyaml(infile)
 
     def validate_file(self, filename):
         '''
@@ -52,10 +191,190 @@ class Validator(object):
         log.debug("opening %s...", filename)
         data = None
         with open(filename, 'r') as infile:
-            data = yaml.safe_load(infile)
+            data = loadyaml(infile)
         return self.validate(data)
 
-    def _validate_dict(self, item, rules, path):
+    def validate_file_incremental(self, filename, state):
+        '''
+        Like validate_file(), but only the subtrees of the file that changed
+        since the last run are checked, see `validate_incremental()`. The
+        `state` dict is read and updated with the digests of the valid
+        subtrees of this file. Use `loadstate()` and `savestate()` to keep it
+        between runs.
+        '''
+        log.debug("opening %s...", filename)
+        with open(filename, 'r') as infile:
+            data = loadyaml(infile)
+        files = state.setdefault('files', dict())
+        key = os.path.abspath(filename)
+        valid, digests = self.validate_incremental(data, set(files.get(key, [])))
+        files[key] = sorted(digests)
+        return valid
+
+    def validate_incremental(self, tree, known=()):
+        '''
+        Validate the object `tree` with the rules of the validator, but skip
+        the elements of a top level list or dict whose content digest is in
+        the set `known`. The result is the same as for a complete validation,
+        since elements are checked independently of each other.
+
+        Returns the result of the validation and the set of digests of all
+        valid elements, which can be given as `known` for the next run.
+
+        >>> v = Validator(rules={'type': 'list', 'values': {'type': 'int'}})
+        >>> valid, digests = v.validate_incremental([1, 2, 3])
+        >>> valid, len(digests)
+        (True, 3)
+        >>> v.validate_incremental([1, 2, 'x'], digests)[0]
+        False
+        '''
+        from hashlib import sha1
+        rules = self.rules
+        kind = rules.get('type')
+        root = (None, '/')
+        if kind == 'list' and isinstance(tree, list):
+            checkvalue = self.compile(rules['values']) if 'values' in rules else None
+            subtrees = ((element, [(checkvalue, element, root, index)])
+                        for index, element in enumerate(tree))
+        elif kind == 'dict' and isinstance(tree, dict):
+            checkkey = self.compile(rules['keys']) if 'keys' in rules else None
+            checkvalue = self.compile(rules['values']) if 'values' in rules else None
+            subtrees = (((key, value), [(checkkey, key, root, key),
+                                        (checkvalue, value, (root, 'values'), value)])
+                        for key, value in tree.items())
+        else:
+            return self.validate(tree), set()
+
+        digests = set()
+        skipped = 0
+        invalid = None
+        for subtree, checks in subtrees:
+            digest = sha1(repr(subtree).encode('utf8')).hexdigest()
+            if digest in known:
+                digests.add(digest)
+                skipped += 1
+                continue
+            if all(check(item, parent, name, None) for check, item, parent, name in checks
+                   if check is not None):
+                digests.add(digest)
+            elif invalid is None:
+                invalid = checks
+        log.info("skipped %d unchanged elements", skipped)
+        if invalid is None:
+            return True, digests
+
+        violations = list()
+        for check, item, parent, name in invalid:
+            if check is not None:
+                check(item, parent, name, violations)
+        log.error("/ IS INVALID: %s", violations[0])
+        if self.throw:
+            raise AssertionError(str(violations[0]))
+        return False, digests
+
+    def file_violations(self, filename):
+        '''
+        Load yaml from the file with given name and return all violations of
+        the rules, see `violations()`.
+        '''
+        log.debug("opening %s...", filename)
+        with open(filename, 'r') as infile:
+            data = loadyaml(infile)
+        return self.violations(data)
+
+    def validate_stream(self, filename, collect=False):
+        '''
+        Validate the file with given name record by record, see `iterrecords()`.
+        Each record is discarded after it was checked, so the memory use is
+        bounded by the largest record, not by the file size.
+
+        Documents which are sequences are only split into their elements if
+        the rules are of type 'list', whose 'values' rule the elements are
+        checked against. All other documents are checked completely against
+        the rules, so the verdict is the same as for `validate_file()`.
+
+        Returns a list of `(path, message)` tuples for all invalid records.
+        If `collect` is set, the list contains all violations within the
+        records instead of only the first one per record.
+        '''
+        rules = self.rules
+        split = rules.get('type') == 'list'
+        elementrules = rules.get('values') if split else rules
+        check = self.compile(rules)
+        checkelement = self.compile(elementrules) if elementrules is not None else None
+        errors = list()
+        count = 0
+        for path, element, record in iterrecords(filename, split):
+            count += 1
+            parent = None
+            for name in path[:-1]:
+                parent = (parent, name)
+            if isinstance(record, BrokenRecord):
+                message = "%s: %s" % (pathstr(parent, path[-1]), record.message)
+                log.error("%s IS INVALID: %s", pathstr(parent, path[-1]), message)
+                errors.append((pathstr(parent, path[-1]), message))
+                continue
+            checker = check if not element else checkelement
+            if checker is None or checker(record, parent, path[-1], None):
+                continue
+            violations = list()
+            checker(record, parent, path[-1], violations)
+            log.error("%s IS INVALID: %s", pathstr(parent, path[-1]), violations[0])
+            if collect:
+                errors.extend((v.path, str(v)) for v in violations)
+            else:
+                errors.append((pathstr(parent, path[-1]), str(violations[0])))
+        log.info("checked %d records of %s, %d invalid", count, filename, len(errors))
+        return errors
+
+    def compile(self, rules=None):
+        '''
+        Return a checker for the given rules, by default for the rule base
+        loaded during the construction of the validator.
+
+        A checker is a function `check(item, parent, name, violations)` which
+        returns True if the item is valid and False otherwise. The path of the
+        item is given as its `name` and the `parent` path, which is a linked
+        `(parent, name)` tuple or None (see `pathstr()`). If `violations` is
+        None, the check stops at the first problem. Otherwise the complete item
+        is checked and a `Violation` is appended for every problem. All rule lookups,
+        regular expressions and bounds are resolved once when the checker is
+        built, so checking many items does not need to interpret the rules
+        again. Compiled checkers are cached per rule object.
+
+        >>> v = Validator(rules={'type': 'list', 'values': {'type': 'int'}})
+        >>> check = v.compile()
+        >>> check([1, 2, 3], None, '/', None)
+        True
+        >>> violations = []
+        >>> check([1, 'a', 3.0], None, '/', violations)
+        False
+        >>> violations
+        [Violation('/:1', '/:1: expected int, got str!'), Violation('/:2', '/:2: expected int, got float!')]
+        >>> v.compile() is check
+        True
+        '''
+        if rules is None: rules = self.rules
+        cached = self._compiled.get(id(rules))
+        if cached is not None and cached[0] is rules:
+            return cached[1]
+        checker = self._compile(rules)
+        self._compiled[id(rules)] = (rules, checker)
+        return checker
+
+    def _compile(self, rules):
+        if not isinstance(rules, dict):
+            print("rules = %s", repr(rules))
+            assert False, "rule must be of type dict, but is %s" % repr(rules)
+        checktype = rules.get('type')
+        try:
+            compiler = getattr(self, "_compile_"+checktype)
+        except Exception:
+            log.error("no validator of type '%s'", checktype)
+            raise
+        return compiler(rules)
+
+    def _compile_dict(self, rules):
         '''
         Validate a dict item. Optional key `regex` can be used to verify the
         content of the string
@@ -76,19 +395,32 @@ class Validator(object):
         >>> v.validate({"4": -42})
         False
         '''
-        assert isinstance(item, dict), "%s: expected dict, got %s!" % (":".join(path), type(item).__name__)
-        checktype = "dict"
-        if "keys" in rules:
-            log.debug("assert correct type of keys of %s...", ":".join(path))
-            for k in item.keys():
-                assert self.validate(k, rules['keys'], path+[str(k)])
-        if "values" in rules:
-            log.debug("assert correct values of %s: %s", ":".join(path), checktype)
-            for v in item.values():
-                assert self.validate(v, rules['values'], path+["values", str(v)])
-        return True
+        checkkey = self._compile(rules['keys']) if "keys" in rules else None
+        checkvalue = self._compile(rules['values']) if "values" in rules else None
+        def check(item, parent, name, violations):
+            if not isinstance(item, dict):
+                if violations is not None:
+                    violations.append(Violation(parent, name, rules, item, "%s: expected dict, got %s!", type(item).__name__))
+                return False
+            valid = True
+            if checkkey is not None:
+                node = (parent, name)
+                for k in item.keys():
+                    if not checkkey(k, node, k, violations):
+                        if violations is None:
+                            return False
+                        valid = False
+            if checkvalue is not None:
+                node = ((parent, name), "values")
+                for v in item.values():
+                    if not checkvalue(v, node, v, violations):
+                        if violations is None:
+                            return False
+                        valid = False
+            return valid
+        return check
 
-    def _validate_str(self, item, rules, path):
+    def _compile_str(self, rules):
         '''
         Validate a string item. Optional key `regex` can be used to verify the
         content of the string
@@ -104,12 +436,48 @@ class Validator(object):
         >>> v.validate("unit 23")
         False
         '''
-        assert isinstance(item, str), "%s: expected str, got %s!" % (":".join(path), type(item).__name__)
+        fullmatch = None
         if "regex" in rules:
-            assert re.fullmatch(rules['regex'], item, rules.get('regex_flags', 0)), "%s INVALID" % ":".join(path)
-        return True
+            fullmatch = re.compile(rules['regex'], rules.get('regex_flags', 0)).fullmatch
+        def check(item, parent, name, violations):
+            if not isinstance(item, str):
+                if violations is not None:
+                    violations.append(Violation(parent, name, rules, item, "%s: expected str, got %s!", type(item).__name__))
+                return False
+            if fullmatch is not None and not fullmatch(item):
+                if violations is not None:
+                    violations.append(Violation(parent, name, rules, item, "%s INVALID"))
+                return False
+            return True
+        return check
+
+    @staticmethod
+    def _rangechecker(rules, numbertype):
+        '''
+        Build a checker for type `numbertype` with the optional range limits
+        'min', 'inf', 'sup' and 'max' given in the rules.
+        '''
+        bounds = [(rules[name], compare, text) for name, compare, text in [
+            ('min', operator.ge, "smaller than min"),
+            ('inf', operator.gt, "not larger than inf"),
+            ('sup', operator.lt, "not smaller than sup"),
+            ('max', operator.le, "larger than max"),
+        ] if name in rules]
+        typename = numbertype.__name__
+        def check(item, parent, name, violations):
+            if not isinstance(item, numbertype):
+                if violations is not None:
+                    violations.append(Violation(parent, name, rules, item, "%s: expected %s, got %s!", typename, type(item).__name__))
+                return False
+            for bound, compare, text in bounds:
+                if not compare(item, bound):
+                    if violations is not None:
+                        violations.append(Violation(parent, name, rules, item, "%s: %r is %s %r", item, text, bound))
+                    return False
+            return True
+        return check
 
-    def _validate_int(self, item, rules, path):
+    def _compile_int(self, rules):
         '''
         Validate an integer.
 
@@ -139,18 +507,9 @@ class Validator(object):
         >>> v.validate(43)
         False
         '''
-        assert isinstance(item, int), "%s: expected int, got %s!" % (":".join(path), type(item).__name__)
-        if "min" in rules:
-            assert item >= rules['min']
-        if "inf" in rules:
-            assert item > rules['inf']
-        if "sup" in rules:
-            assert item < rules['sup']
-        if "max" in rules:
-            assert item <= rules['max']
-        return True
+        return self._rangechecker(rules, int)
 
-    def _validate_float(self, item, rules, path):
+    def _compile_float(self, rules):
         '''
         Validate a floating point number.
 
@@ -180,18 +539,9 @@ class Validator(object):
         >>> v.validate(43.)
         False
         '''
-        assert isinstance(item, float), "%s: expected float got %s!" % (":".join(path), type(item).__name__)
-        if "min" in rules:
-            assert item >= rules['min']
-        if "inf" in rules:
-            assert item > rules['inf']
-        if "sup" in rules:
-            assert item < rules['sup']
-        if "max" in rules:
-            assert item <= rules['max']
-        return True
+        return self._rangechecker(rules, float)
 
-    def _validate_in(self, item, rules, path):
+    def _compile_in(self, rules):
         '''
         Branch validation to satisfy any of a given list of rules
 
@@ -208,21 +558,18 @@ class Validator(object):
         >>> v.validate(42.0)
         False
         '''
-        ###
-        ### NOTE: Since this is an idirect validation calling self.validate()
-        ### the result must be asserted in order to be independant of self.throw.
-        ###
-        checkers = rules['values']
-        assert isinstance(checkers, list), "checker of type 'in' must have 'values'"
-        for rule in checkers:
-            try:
-                assert self.validate(item, rule, path)
-                return True
-            except AssertionError:
-                pass
-        assert False, "%s: got %s, expected %s" % (":".join(path), type(item).__name__, str(rules))
-
-    def _validate_list(self, item, rules, path):
+        assert isinstance(rules['values'], list), "checker of type 'in' must have 'values'"
+        checkers = [self._compile(rule) for rule in rules['values']]
+        def check(item, parent, name, violations):
+            for checker in checkers:
+                if checker(item, parent, name, None):
+                    return True
+            if violations is not None:
+                violations.append(Violation(parent, name, rules, item, "%s: got %s, expected %s", type(item).__name__, rules))
+            return False
+        return check
+
+    def _compile_list(self, rules):
         '''
         >>> v = Validator(rules={'type': 'list'})
         >>> v.validate([1,2,3])
@@ -235,13 +582,24 @@ class Validator(object):
         >>> v.validate([1,'str',3])
         False
         '''
-        assert isinstance(item, list), "%s: expected list, got %s!" % (":".join(path), type(item).__name__)
-        if "values" in rules:
-            for i, subitem in enumerate(item):
-                assert self.validate(subitem, rules['values'], path+[str(i)])
-        return True
+        checkvalue = self._compile(rules['values']) if "values" in rules else None
+        def check(item, parent, name, violations):
+            if not isinstance(item, list):
+                if violations is not None:
+                    violations.append(Violation(parent, name, rules, item, "%s: expected list, got %s!", type(item).__name__))
+                return False
+            valid = True
+            if checkvalue is not None:
+                node = (parent, name)
+                for i, subitem in enumerate(item):
+                    if not checkvalue(subitem, node, i, violations):
+                        if violations is None:
+                            return False
+                        valid = False
+            return valid
+        return check
 
-    def _validate_dictdescent(self, item, rules, path):
+    def _compile_dictdescent(self, rules):
         '''
         >>> v = Validator(rules={'type': 'dictdescent'})
         >>> v.validate([1,2,3])
@@ -252,22 +610,42 @@ class Validator(object):
         >>> v.validate([1,'str',3])
         False
         '''
-        assert isinstance(item, dict), "%s: expected dict, got %s!" % (":".join(path), type(item).__name__)
-        if "mandatory" in rules:
-            assert all([key in item for key in rules['mandatory']]), "%s: misses mandatory keys" % (":".join(path))
-        #if "allowed" in rules:
-        #   good
-        if "deprecated" in rules:
-            for key in rules['deprecated'].keys():
+        mandatory = list(rules.get('mandatory', []))
+        deprecated = list(rules['deprecated'].keys()) if "deprecated" in rules else []
+        forbidden = list(rules['forbidden'].keys()) if "forbidden" in rules else []
+        known = set()
+        for good in ['mandatory', 'allowed', 'deprecated']:
+            known.update(rules.get(good, {}))
+        othersallowed = rules.get("others-allowed", False)
+        def check(item, parent, name, violations):
+            if not isinstance(item, dict):
+                if violations is not None:
+                    violations.append(Violation(parent, name, rules, item, "%s: expected dict, got %s!", type(item).__name__))
+                return False
+            valid = True
+            for key in mandatory:
+                if key not in item:
+                    if violations is None:
+                        return False
+                    violations.append(Violation(parent, name, rules, item, "%s: misses mandatory key %r", key))
+                    valid = False
+            for key in deprecated:
                 if key in item:
-                    log.warning("%s: deprecated key %s", ":".join(path), key)
-        if "forbidden" in rules:
-            assert not any([key in item for key in rules['forbidden'].keys()]), "%s: has forbidden keys" % (":".join(path))
-
-        otherkeys = [key for key in item.keys() if not any([key in rules.get(good, {}) for good in ['mandatory', 'allowed', 'deprecated']])]
-        assert rules.get("others-allowed", False) or not any(otherkeys), "%s: there are keys that are addtional keys %s and others-allowed is False" % (":".join(path), repr(otherkeys))
-
-        return True
+                    log.warning("%s: deprecated key %s", pathstr(parent, name), key)
+            for key in forbidden:
+                if key in item:
+                    if violations is None:
+                        return False
+                    violations.append(Violation(parent, name, rules, item, "%s: has forbidden key %r", key))
+                    valid = False
+            if not othersallowed:
+                otherkeys = [key for key in item.keys() if key not in known]
+                if any(otherkeys):
+                    if violations is not None:
+                        violations.append(Violation(parent, name, rules, item, "%s: there are keys that are addtional keys %s and others-allowed is False", repr(otherkeys)))
+                    valid = False
+            return valid
+        return check
 
     def validate(self, tree, rules=None, path=['/']):
         '''
@@ -284,37 +662,212 @@ class Validator(object):
             ...
         AssertionError: /: expected list, got int!
         '''
-        if rules is None: rules = self.rules
-        if not isinstance(rules, dict):
-            print("rules = %s", repr(rules))
-            assert False, "rule must be of type dict, but is %s" % repr(rules)
-        checktype = rules.get('type')
-        try:
-            check = getattr(self, "_validate_"+checktype)
-        except Exception:
-            log.error("no validator of type '%s'", checktype)
-            raise
-        try:
-            log.debug("assert correct type %s: %s", ":".join(path), checktype)
-            assert check(tree, rules, path), "validation of %s failed!" % checktype
-        except AssertionError as e:
-            log.error("%s IS INVALID: %s", ":".join(path), e)
-            if self.throw:
-                raise
-            return False
-        log.debug("%s validated as %s", ":".join(path), checktype)
-        return True
+        check = self.compile(rules)
+        parent = None
+        for name in path[:-1]:
+            parent = (parent, name)
+        name = path[-1]
+        if check(tree, parent, name, None):
+            return True
+        # check again to find out what is wrong
+        violations = list()
+        check(tree, parent, name, violations)
+        log.error("%s IS INVALID: %s", pathstr(parent, name), violations[0])
+        if self.throw:
+            raise AssertionError(str(violations[0]))
+        return False
 
-if __name__ == '__main__':
-    args = docopt(__doc__)
+    def violations(self, tree, rules=None, path=['/']):
+        '''
+        Check the complete object `tree` and return a list of all violations of
+        the rules, instead of stopping at the first one like `validate()`.
+        Each `Violation` has the attributes `path`, `rule` and `value`.
+
+        >>> v = Validator(rules={'type': 'dict', 'values': {'type': 'int', 'max': 9}})
+        >>> [(x.path, x.value) for x in v.violations({'a': 1, 'b': 'x', 'c': 10})]
+        [('/:values:x', 'x'), ('/:values:10', 10)]
+        >>> v.violations({'a': 1})
+        []
+        '''
+        check = self.compile(rules)
+        parent = None
+        for name in path[:-1]:
+            parent = (parent, name)
+        violations = list()
+        check(tree, parent, path[-1], violations)
+        return violations
+
+_worker = None
+
+def _initworker(rules):
+    global _worker
+    _worker = Validator(rules=rules)
+
+def _validatefile(filename, stream, collect):
+    return _runfile(_worker, filename, stream, collect)
+
+def _runfile(validator, filename, stream, collect):
+    if stream:
+        return validator.validate_stream(filename, collect)
+    if collect:
+        return [(v.path, str(v)) for v in validator.file_violations(filename)]
+    return validator.validate_file(filename)
+
+def _checkchunk(kind, chunk):
+    '''
+    Check a chunk of elements of the top level container with the compiled
+    rules of the worker. Returns None if all elements are valid, otherwise the
+    message for the first invalid element.
+    '''
+    rules = _worker.rules
+    root = (None, '/')
+    violations = list()
+    if kind == 'list':
+        check = _worker.compile(rules['values'])
+        for index, element in chunk:
+            if not check(element, root, index, None):
+                check(element, root, index, violations)
+                return str(violations[0])
+    else:
+        checkkey = _worker.compile(rules['keys']) if 'keys' in rules else None
+        checkvalue = _worker.compile(rules['values']) if 'values' in rules else None
+        for key, value in chunk:
+            if checkkey is not None and not checkkey(key, root, key, None):
+                checkkey(key, root, key, violations)
+                return str(violations[0])
+            if checkvalue is not None and not checkvalue(value, (root, 'values'), value, None):
+                checkvalue(value, (root, 'values'), value, violations)
+                return str(violations[0])
+    return None
+
+def _validatesharded(validator, filename, pool, jobs):
+    '''
+    Load a single file and check the elements of its top level list or dict
+    in chunks distributed over the worker `pool`.
+    '''
+    data = None
+    with open(filename, 'r') as infile:
+        data = loadyaml(infile)
+    rules = validator.rules
+    kind = rules.get('type')
+    if kind == 'list' and 'values' in rules and isinstance(data, list):
+        items = list(enumerate(data))
+    elif kind == 'dict' and isinstance(data, dict):
+        items = list(data.items())
+    else:
+        return validator.validate(data)
+    size = max(1, len(items) // (jobs * 4))
+    chunks = [items[i:i+size] for i in range(0, len(items), size)]
+    valid = True
+    for message in pool.map(_checkchunk, repeat(kind), chunks):
+        if message is not None:
+            log.error("/ IS INVALID: %s", message)
+            valid = False
+    return valid
+
+def loadstate(statefile, rules):
+    '''
+    Load the state of incremental validations from the JSON file `statefile`.
+    The state is discarded if it was stored for other rules or if the file
+    does not exist.
+    '''
+    import json
+    from hashlib import sha1
+    rulesdigest = sha1(repr(rules).encode('utf8')).hexdigest()
+    try:
+        with open(statefile, 'r') as infile:
+            state = json.load(infile)
+    except (OSError, ValueError):
+        state = dict()
+    if state.get('rules') != rulesdigest:
+        log.debug("starting with empty state, rules changed")
+        state = {'rules': rulesdigest, 'files': dict()}
+    return state
+
+def savestate(statefile, state):
+    '''
+    Store the state of incremental validations in the JSON file `statefile`.
+    '''
+    import json
+    tmpname = statefile + '.tmp'
+    with open(tmpname, 'w') as outfile:
+        json.dump(state, outfile)
+    os.replace(tmpname, statefile)
+
+def expandfilenames(patterns):
+    '''
+    Expand the glob patterns among the given file names. Patterns without
+    matches are kept, so that missing files are reported. Every file is only
+    returned once, in the order of the first occurrence.
+    '''
+    import glob
+    filenames = list()
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else []
+        filenames.extend(matches or [pattern])
+    return list(dict.fromkeys(filenames))
+
+def validate_files(validator, filenames, jobs=1, stream=False, collect=False):
+    '''
+    Validate all given files and return the results in the same order. The
+    result of a file is the return value of `validate_file()`, or of
+    `validate_stream()` if `stream` is set. If `collect` is set, the result
+    is a list of `(path, message)` tuples for all violations.
+
+    With `jobs` > 1 the work is distributed over a pool of processes, each
+    with its own compiled copy of the rules. If there are fewer files than
+    jobs, the elements of the top level list or dict of each file are
+    distributed instead.
+    '''
+    if jobs <= 1:
+        return [_runfile(validator, filename, stream, collect) for filename in filenames]
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(jobs, initializer=_initworker, initargs=(validator.rules,)) as pool:
+        if stream or collect or len(filenames) >= jobs:
+            return list(pool.map(_validatefile, filenames, repeat(stream), repeat(collect)))
+        return [_validatesharded(validator, filename, pool, jobs) for filename in filenames]
+
+def main(cmdline=None):
+    from docopt import docopt
+    import shlex
+    logging.basicConfig(level=100) #logging.INFO)
+    if cmdline is None:
+        cmdline = sys.argv[1:]
+    else:
+        cmdline = shlex.split(cmdline)  # have a possibility for testing
+    args = docopt(__doc__, cmdline)
     if args['--verbose']:
         log.setLevel(logging.DEBUG)
 
     validator = Validator(rulefile = args['--validation'])
 
-    valid = validator.validate_file(args['<filename>'])
-    if valid:
-        print("valid.")
+    filenames = expandfilenames(args['<filename>'])
+    if args['--state'] is not None:
+        state = loadstate(args['--state'], validator.rules)
+        results = [validator.validate_file_incremental(filename, state)
+                   for filename in filenames]
+        savestate(args['--state'], state)
     else:
-        print("INVALID!")
+        results = validate_files(validator, filenames, int(args['--jobs']),
+                                 args['--stream'], args['--all'])
+    allvalid = True
+    for filename, result in zip(filenames, results):
+        prefix = "%s: " % filename if len(filenames) > 1 else ""
+        if args['--stream'] or args['--all']:
+            # the messages start with the path of the violation
+            for _, message in result:
+                print(prefix + message)
+            valid = not result
+        else:
+            valid = result
+        if valid:
+            print(prefix + "valid.")
+        else:
+            print(prefix + "INVALID!")
+        allvalid = allvalid and valid
+    return 0 if allvalid else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
 
@@ -0,0 +1,276 @@
+# encoding: utf8
+'''
+Render a report again whenever its template, filters or data change.
+
+With --watch the reporter renders the report, waits until one of the files
+it is made from changes and renders it again, until it is interrupted. The
+environment and the parsed data files are kept in memory like by the server,
+see `datareport.server.Session`, so only what changed is loaded again:
+
+  * a changed data file is parsed again, the other files are kept,
+  * a changed template or included template is compiled again by jinja2,
+  * a changed filter file gives a new environment, since the compiled
+    templates are bound to the filters they use.
+
+Changes are noticed with inotify on Linux, otherwise by polling the size and
+modification time of the files. Editors often write a file in several steps,
+so the report is only rendered when no further change arrived for a short
+time.
+'''
+import ctypes
+import logging
+import os
+import select
+import struct
+import time
+import traceback
+try:
+    from datareport import reporter
+    from datareport.server import Session, filestate
+except ImportError:  # running as script from the source tree
+    import reporter
+    from server import Session, filestate
+
+log = logging.getLogger()
+
+# seconds without further changes before the report is rendered again
+DELAY = 0.2
+
+# seconds between two checks of the files when polling
+INTERVAL = 0.5
+
+# inotify events which change the content of a file in a watched directory
+_IN_MODIFY = 0x002
+_IN_ATTRIB = 0x004
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_CLOEXEC = 0o2000000
+_MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM \
+    | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+
+# struct inotify_event without the name following it
+_EVENT = struct.Struct('iIII')
+
+
+class Inotify(object):
+    '''
+    Notices changes of the given files with the inotify API of Linux. The
+    directories of the files are watched, so that files which are replaced
+    by editors are noticed, too. Raises OSError if inotify is not available.
+    '''
+    def __init__(self, filenames):
+        libc = ctypes.CDLL(None, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError("inotify is not available")
+        self.files = set(os.path.abspath(filename) for filename in filenames)
+        self.fd = libc.inotify_init1(_IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.directories = dict()
+        try:
+            for directory in set(os.path.dirname(filename) for filename in self.files):
+                wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), _MASK)
+                if wd < 0:
+                    errno = ctypes.get_errno()
+                    raise OSError(errno, os.strerror(errno), directory)
+                self.directories[wd] = directory
+        except OSError:
+            self.close()
+            raise
+
+    def _read(self):
+        changed = set()
+        buffer = os.read(self.fd, 65536)
+        offset = 0
+        while offset < len(buffer):
+            wd, _, _, length = _EVENT.unpack_from(buffer, offset)
+            offset += _EVENT.size
+            name = buffer[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if wd in self.directories and name:
+                filename = os.path.join(self.directories[wd], os.fsdecode(name))
+                if filename in self.files:
+                    changed.add(filename)
+        return changed
+
+    def wait(self, timeout=None):
+        '''
+        Return the set of watched files which changed, waiting at most
+        `timeout` seconds, or forever if it is None, for a change.
+        '''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            if not ready:
+                return set()
+            changed = self._read()
+            if changed:
+                return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class Poller(object):
+    '''
+    Notices changes of the given files by checking their size and
+    modification time every `interval` seconds, by default `INTERVAL`.
+    '''
+    def __init__(self, filenames, interval=None):
+        self.states = {os.path.abspath(filename): filestate(filename)
+                       for filename in filenames}
+        self.files = set(self.states)
+        self.interval = INTERVAL if interval is None else interval
+
+    def wait(self, timeout=None):
+        '''
+        Return the set of watched files which changed, waiting at most
+        `timeout` seconds, or forever if it is None, for a change.
+        '''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changed = set()
+            for filename, state in self.states.items():
+                current = filestate(filename)
+                if current != state:
+                    self.states[filename] = current
+                    changed.add(filename)
+            if changed:
+                return changed
+            if deadline is None:
+                time.sleep(self.interval)
+            elif time.monotonic() >= deadline:
+                return set()
+            else:
+                time.sleep(min(self.interval, deadline - time.monotonic()))
+
+    def close(self):
+        pass
+
+
+def watcher(filenames):
+    '''
+    Return an `Inotify` watcher for the given files, or a `Poller` if inotify
+    cannot be used.
+    '''
+    try:
+        return Inotify(filenames)
+    except OSError as e:
+        log.debug("cannot use inotify (%s), polling files", e)
+        return Poller(filenames)
+
+
+def changes(filenames, delay=DELAY, since=None):
+    '''
+    Wait until some of the given files change and return the set of their
+    absolute names. Changes are collected until none arrived for `delay`
+    seconds. Files modified after the time `since`, e.g. while the report
+    was rendered, count as changed at once.
+    '''
+    watching = watcher(filenames)
+    try:
+        changed = set()
+        if since is not None:
+            changed = set(filename for filename in watching.files
+                          if (filestate(filename) or (0, 0))[1] > since * 1e9)
+        if not changed:
+            changed = watching.wait()
+        while True:
+            more = watching.wait(delay)
+            if not more:
+                return changed
+            changed |= more
+    finally:
+        watching.close()
+
+
+def templatefiles(env, name, templatedir):
+    '''
+    Return the files of the template `name` and of the templates it
+    includes, imports or extends. Templates which cannot be parsed are
+    included, but not their references. If a template refers to templates
+    whose names are computed while rendering, all templates are included.
+    '''
+    from jinja2 import meta, TemplateNotFound, TemplateSyntaxError
+    files = dict()
+    pending = [name]
+    dynamic = False
+    while pending:
+        current = pending.pop()
+        if current in files:
+            continue
+        try:
+            source, filename, _ = env.loader.get_source(env, current)
+        except TemplateNotFound:
+            # noticed when it is created
+            files[current] = os.path.join(templatedir, current)
+            continue
+        files[current] = filename
+        try:
+            references = meta.find_referenced_templates(env.parse(source))
+        except TemplateSyntaxError:
+            continue
+        for reference in references:
+            if reference is None:
+                dynamic = True
+            else:
+                pending.append(reference)
+    if dynamic:
+        log.debug("template '%s' has dynamic dependencies, watching all templates", name)
+        for current in env.list_templates():
+            if current not in files:
+                files[current] = env.loader.get_source(env, current)[1]
+    return list(files.values())
+
+
+def watchedfiles(args, session):
+    '''
+    Return the files the report defined by the reporter arguments `args` is
+    made from: the templates, filter files, data files and validation rules.
+    The output file is never included.
+    '''
+    files = list(args['--filter'])
+    files += [datadef.split("=", 1)[1] for datadef in args['<datadef>']]
+    common, bykey = reporter.parsevalidations(args['--validation'])
+    files += common + [rulefile for rules in bykey.values() for rulefile in rules]
+    try:
+        env = session.environment(args['--template-dir'], args['--filter'],
+                                  args['--template-cache'])
+    except Exception:  # a broken filter file, which is reported by the render
+        files.append(os.path.join(args['--template-dir'], args['--template']))
+    else:
+        files += templatefiles(env, args['--template'], args['--template-dir'])
+    files = dict.fromkeys(os.path.abspath(filename) for filename in files)
+    if args['--output'] is not None:
+        files.pop(os.path.abspath(args['--output']), None)
+    return list(files)
+
+
+def run(cmdline, args):
+    '''
+    Render the report defined by the reporter command line `cmdline`, with
+    the parsed arguments `args`, and render it again whenever one of its
+    files changes, until interrupted.
+    '''
+    session = Session()
+    try:
+        while True:
+            started = time.time()
+            try:
+                reporter.main(cmdline, session=session)
+            except Exception:
+                # e.g. a syntax error in the template, which can be fixed
+                log.error("%s", traceback.format_exc())
+            files = watchedfiles(args, session)
+            log.info("watching %d files for changes...", len(files))
+            for filename in sorted(changes(files, since=started)):
+                log.info("'%s' changed", filename)
+    except KeyboardInterrupt:
+        return 0
@@ -27,6 +27,11 @@ setup(
     },
 
     install_requires=install_requires,
+    # fast parsers for the orjson and libyaml data formats
+    extras_require={
+        'orjson': ['orjson'],
+        'libyaml': ['PyYAML'],
+    },
 
     author="Dennis Terhorst",
     author_email="d.terhorst@fz-juelich.de",
@@ -36,6 +41,8 @@ setup(
     entry_points = {
         'console_scripts': [
             'reporter = datareport.reporter:main',
+            'reporter-server = datareport.server:main',
+            'reporter-client = datareport.client:main',
         ],
     },
 
@@ -128,3 +128,493 @@ The cut version is
     * l
     * d
 '''
+
+def test_cache(tmpdir):
+    # check if cached data is reused and refreshed after changes
+    template = tmpdir.join("report.md")
+    template.write("# Hello {{ data.name }}")
+    yaml = tmpdir.join("data.yaml")
+    yaml.write("name: World")
+    cachedir = tmpdir.join("cache")
+    output = tmpdir.join("output.md")
+    cmd = "-v --template-dir '%s' --cache-dir '%s' data=%s -o '%s'" % (tmpdir, cachedir, yaml, output)
+
+    reporter(cmd)
+    assert output.read() == "# Hello World"
+    assert len(cachedir.listdir()) == 1
+
+    reporter(cmd)
+    assert output.read() == "# Hello World"
+
+    # a touched file is loaded by content, only the header of the entry is rewritten
+    entry = cachedir.listdir()[0]
+    inode = os.stat(str(entry)).st_ino
+    stat = os.stat(str(yaml))
+    os.utime(str(yaml), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    reporter(cmd)
+    assert output.read() == "# Hello World"
+    assert os.stat(str(entry)).st_ino == inode
+    reporter(cmd)
+    assert output.read() == "# Hello World"
+
+    yaml.write("name: Moon")
+    reporter(cmd)
+    assert output.read() == "# Hello Moon"
+    assert len(cachedir.listdir()) == 1
+
+def test_jobs(tmpdir):
+    # check if parallel loading keeps the order of list entries
+    template = tmpdir.join("report.md")
+    template.write("{{ single.name }}:{% for x in items %} {{ x.name }}{% endfor %}")
+    datadefs = ["single=%s" % tmpdir.join("single.yaml")]
+    tmpdir.join("single.yaml").write("name: first")
+    for i in range(6):
+        yaml = tmpdir.join("item%d.yaml" % i)
+        yaml.write("name: item%d" % i)
+        datadefs.append("items=%s" % yaml)
+    output = tmpdir.join("output.md")
+    reporter("-v --jobs 3 --list=items --template-dir '%s' -o '%s' %s" % (tmpdir, output, " ".join(datadefs)))
+    assert output.read() == "first: item0 item1 item2 item3 item4 item5"
+
+def test_batch(tmpdir):
+    # check if all jobs of a batch manifest are rendered with shared data
+    tmpdir.join("hello.md").write("Hello {{ data.name }}")
+    tmpdir.join("list.md").write("{% for x in items %}{{ x.name }} {% endfor %}")
+    tmpdir.join("a.yaml").write("name: A")
+    tmpdir.join("b.yaml").write("name: B")
+    manifest = tmpdir.join("manifest.yaml")
+    manifest.write('''
+jobs:
+  - template: hello.md
+    output: {tmpdir}/hello.out
+    datadefs: [data={tmpdir}/a.yaml]
+  - template: list.md
+    output: {tmpdir}/list.out
+    list: [items]
+    datadefs:
+      items: [{tmpdir}/b.yaml, {tmpdir}/a.yaml]
+'''.format(tmpdir=tmpdir))
+    for jobs in (1, 2):
+        assert reporter("-v --jobs %d --template-dir '%s' --batch '%s'" % (jobs, tmpdir, manifest)) == 0
+        assert tmpdir.join("hello.out").read() == "Hello A"
+        assert tmpdir.join("list.out").read() == "B A "
+
+    # options for single reports are rejected
+    for option in ("--profile=p.json", "--profile-blocks", "--deps=deps.json"):
+        assert reporter("--template-dir '%s' --batch '%s' %s" % (tmpdir, manifest, option)) == 1
+
+def test_buffer_size(tmpdir):
+    # check if the streamed output is independent of the write buffer size
+    template = tmpdir.join("report.md")
+    template.write("{% for i in range(100) %}line {{ i }}\n{% endfor %}")
+    expected = "".join("line %d\n" % i for i in range(100))
+    output = tmpdir.join("output.md")
+    for size in (0, 10, 65536):
+        reporter("-v --buffer-size %d --template-dir '%s' -o '%s'" % (size, tmpdir, output))
+        assert output.read() == expected
+
+def test_template_cache(tmpdir):
+    # check if compiled templates are cached and invalidated on changes
+    templates = tmpdir.mkdir("templates")
+    template = templates.join("report.md")
+    template.write("# Hello World")
+    cachedir = tmpdir.join("cache")
+    output = tmpdir.join("output.md")
+    cmd = "-v --template-dir '%s' --template-cache '%s' -o '%s'" % (templates, cachedir, output)
+
+    reporter(cmd)
+    assert output.read() == "# Hello World"
+    assert len(cachedir.listdir()) == 1
+
+    template.write("# Hello Moon")
+    reporter(cmd)
+    assert output.read() == "# Hello Moon"
+
+    filters = tmpdir.join("f.py")
+    filters.write("def bar(x):\n    return x+'bar'\n")
+    reporter(cmd + " --filter '%s'" % filters)
+    assert output.read() == "# Hello Moon"
+    assert len(cachedir.listdir()) == 2
+
+def test_deps(tmpdir):
+    # check if rendering is skipped as long as no dependency changes
+    template = tmpdir.join("report.md")
+    template.write("{% include 'part.md' %} {{ data.name }}")
+    part = tmpdir.join("part.md")
+    part.write("Hello")
+    yaml = tmpdir.join("data.yaml")
+    yaml.write("name: World")
+    output = tmpdir.join("output.md")
+    deps = tmpdir.join("output.deps")
+    cmd = "-v --template-dir '%s' --deps '%s' -o '%s' data=%s" % (tmpdir, deps, output, yaml)
+
+    reporter(cmd)
+    assert output.read() == "Hello World"
+    output.write("untouched")
+    reporter(cmd)
+    assert output.read() == "untouched"
+
+    part.write("Bye")
+    reporter(cmd)
+    assert output.read() == "Bye World"
+
+    yaml.write("name: Moon")
+    reporter(cmd)
+    assert output.read() == "Bye Moon"
+
+    output.write("untouched")
+    reporter(cmd.replace("-v ", "-v --meta-dict meta "))
+    assert output.read() == "Bye Moon"
+
+    # a failed render is rendered again, even if the dependencies are restored
+    yaml.write("name: [unclosed")
+    with pytest.raises(Exception):
+        reporter(cmd)
+    assert not deps.check()
+    output.write("")
+    yaml.write("name: Moon")
+    reporter(cmd)
+    assert output.read() == "Bye Moon"
+
+def test_binary(tmpdir):
+    # check if converted data renders like the original data
+    template = tmpdir.join("report.md")
+    template.write("{{ data.name }}: {{ data.numbers[1:3]|join(',') }} {{ data.nested.a }}"
+                   "{% for k, v in data.nested|dictsort %} {{k}}={{v}}{% endfor %}")
+    yaml = tmpdir.join("data.yaml")
+    yaml.write("name: World\nnumbers: [1, 2, 3, 4]\nnested: {b: [x], a: 1}\n")
+    binfile = tmpdir.join("data.bin")
+    reporter("-v convert '%s' '%s'" % (yaml, binfile))
+    assert binfile.check()
+
+    for options in ("", "--binary"):
+        output = tmpdir.join("output.md")
+        datafile = binfile if options else yaml
+        reporter("-v %s --template-dir '%s' -o '%s' data=%s" % (options, tmpdir, output, datafile))
+        assert output.read() == "World: 2,3 1 a=1 b=['x']"
+
+def test_binary_json(tmpdir):
+    # check if converted data behaves like dicts and lists in templates
+    template = tmpdir.join("report.md")
+    template.write("{{ data | tojson }} {{ data is mapping }} {{ data.records is sequence }}"
+                   " {{ data.records[0] is mapping }} {{ data.records[-1] | tojson }}")
+    yaml = tmpdir.join("data.yaml")
+    yaml.write("records:\n" + "".join(
+        "  - {name: record%d, text: %s, values: [%d, %d]}\n" % (i, "x" * 50, i, i * i) for i in range(200)))
+    binfile = tmpdir.join("data.drb")
+    reporter("-v convert '%s' '%s'" % (yaml, binfile))
+
+    outputs = []
+    for datafile in (yaml, binfile):
+        output = tmpdir.join("output.md")
+        reporter("-v --template-dir '%s' -o '%s' data=%s" % (tmpdir, output, datafile))
+        outputs.append(output.read())
+    assert outputs[0] == outputs[1]
+    assert outputs[0].endswith(" True True True " + '{"name": "record199", "text": "%s", "values": [199, 39601]}' % ("x" * 50))
+
+def test_binary_safe(tmpdir):
+    # check if pickles of other classes are not loaded from binary files
+    from datareport import binary
+    from fractions import Fraction
+    import pickle
+    filename = str(tmpdir.join("data.drb"))
+    blob = pickle.dumps(Fraction(1, 3))
+    with open(filename, "wb") as outfile:
+        outfile.write(binary.MAGIC + b"P" + binary._number.pack(len(blob)) + blob
+                      + binary._number.pack(len(binary.MAGIC)))
+    with pytest.raises(pickle.UnpicklingError):
+        binary.load(filename)
+
+    # and are not stored, either
+    with pytest.raises(ValueError):
+        binary.dump({"value": Fraction(1, 3)}, filename)
+    assert not os.path.exists(filename + ".tmp")
+
+    # ordered dicts are stored as plain dicts
+    from collections import OrderedDict
+    binary.dump([OrderedDict(a=1)], filename)
+    assert binary.load(filename) == [{"a": 1}]
+
+def test_binary_roundtrip(tmpdir):
+    # check if the scalar types of the ruamel round trip loader are converted
+    template = tmpdir.join("report.md")
+    template.write("{{ data.f + 1 }} {{ data.s }} {{ data.h + 1 }} {{ data.b }} {{ data.c }}"
+                   " {{ data.set | sort | join(',') }} {{ data.d.year }}")
+    yaml = tmpdir.join("data.yaml")
+    yaml.write("f: 1.50\ns: |\n  text\nh: 0x1F\nb: &b true\nc: *b\n"
+               "set: !!set {a: null, b: null}\nd: 2020-01-02\n")
+    binfile = tmpdir.join("data.drb")
+    reporter("-v --yaml-loader=rt convert '%s' '%s'" % (yaml, binfile))
+
+    outputs = []
+    for datafile in (yaml, binfile):
+        output = tmpdir.join("output.md")
+        reporter("-v --yaml-loader=rt --template-dir '%s' -o '%s' data=%s" % (tmpdir, output, datafile))
+        outputs.append(output.read())
+    # anchored booleans are an int subclass, stored as bools
+    assert outputs[0] == "2.5 text\n 32 1 1 a,b 2020"
+    assert outputs[1] == "2.5 text\n 32 True True a,b 2020"
+
+def test_binary_lazy(tmpdir):
+    # check if large containers are decoded lazily
+    from datareport import binary
+    data = {"serial%d" % i: {"model": "x" * 100, "history": list(range(i))} for i in range(200)}
+    filename = str(tmpdir.join("data.bin"))
+    binary.dump(data, filename)
+    loaded = binary.load(filename)
+    assert isinstance(loaded, binary.LazyDict)
+    assert len(loaded._values) == 0
+    assert loaded["serial42"] == data["serial42"]
+    assert len(loaded._values) == 1
+    assert dict(loaded) == data
+
+def test_lazy(tmpdir, caplog):
+    # check if unused data files are not loaded with --lazy
+    template = tmpdir.join("report.md")
+    template.write("{% if 0 %}{{ unused.name }}{% endif %}{{ data.name }}"
+                   "{% for k, v in data.items() %} {{k}}{% endfor %}")
+    yaml = tmpdir.join("data.yaml")
+    yaml.write("name: World\nother: 1\n")
+    broken = tmpdir.join("broken.yaml")
+    broken.write("{ this is not: yaml")
+    output = tmpdir.join("output.md")
+    reporter("-v --lazy --template-dir '%s' -o '%s' data=%s unused=%s" % (tmpdir, output, yaml, broken))
+    assert output.read() == "World name other"
+    assert "'%s' was not used" % broken in caplog.text
+    assert "accessed keys: name (1x)" in caplog.text
+
+def test_lazy_same_output(tmpdir):
+    # check if proxies render like the data they stand for
+    template = tmpdir.join("report.md")
+    template.write("{{ data is mapping }} {{ data | tojson }} {{ data == same }} {{ data != other }}"
+                   " {{ items is sequence }} {{ items is mapping }} {{ items | last }}"
+                   " {{ items | length }} {{ items | tojson }} {{ data | dictsort | first }}")
+    tmpdir.join("data.yaml").write("name: World\nvalues: [1, 2]\n")
+    tmpdir.join("same.yaml").write("{name: World, values: [1, 2]}\n")
+    tmpdir.join("other.yaml").write("name: Moon\n")
+    tmpdir.join("items.yaml").write("- a\n- b\n- c\n")
+    datadefs = " ".join("%s=%s" % (name, tmpdir.join(name + ".yaml")) for name in ["data", "same", "other", "items"])
+    output = tmpdir.join("output.md")
+    outputs = []
+    for options in ("", "--lazy"):
+        reporter("-v %s --template-dir '%s' -o '%s' %s" % (options, tmpdir, output, datadefs))
+        outputs.append(output.read())
+    assert outputs[0] == outputs[1]
+    assert outputs[1] == ('True {"name": "World", "values": [1, 2]} True True'
+                          ' True False c 3 ["a", "b", "c"] (\'name\', \'World\')')
+
+def test_rows(tmpdir):
+    # check if CSV, TSV and JSON Lines rows can be iterated in templates
+    template = tmpdir.join("report.md")
+    template.write("{% for src in [csv, tsv, jsonl, explicit] %}"
+                   "{% for row in src %}{{ row.Name }}:{{ row.Phone }} {% endfor %}|"
+                   "{% endfor %}{{ csv|length }}")
+    tmpdir.join("list.csv").write("Name,Phone\nAlice,123\nBob,456\n")
+    tmpdir.join("list.tsv").write("Name\tPhone\nAlice\t123\nBob\t456\n")
+    tmpdir.join("list.jsonl").write('{"Name": "Alice", "Phone": "123"}\n{"Name": "Bob", "Phone": "456"}\n')
+    tmpdir.join("list.txt").write("Name,Phone\nAlice,123\nBob,456\n")
+    output = tmpdir.join("output.md")
+    reporter("-v --template-dir '{0}' -o '{1}' csv={0}/list.csv tsv={0}/list.tsv "
+             "jsonl={0}/list.jsonl explicit:csv={0}/list.txt".format(tmpdir, output))
+    assert output.read() == "Alice:123 Bob:456 |" * 4 + "2"
+
+def test_rows_sequence(tmpdir):
+    # check if rows can be indexed, sliced and reversed like a list
+    template = tmpdir.join("report.md")
+    template.write("{{ csv[0].Name }} {{ csv[-1].Name }} {{ (csv | last).Phone }}"
+                   " {{ csv[1:] | map(attribute='Name') | join(',') }}"
+                   " {{ csv[::-2] | map(attribute='Name') | join(',') }} {{ csv[5] is undefined }}"
+                   " {{ csv is sequence }} {{ csv[:1] | tojson }}")
+    tmpdir.join("list.csv").write("Name,Phone\nAlice,123\nBob,456\nCarol,789\n")
+    output = tmpdir.join("output.md")
+    reporter("-v --template-dir '{0}' -o '{1}' csv={0}/list.csv".format(tmpdir, output))
+    assert output.read() == ('Alice Carol 789 Bob,Carol Carol,Alice True True'
+                             ' [{"Name": "Alice", "Phone": "123"}]')
+
+def test_mixed_formats(tmpdir):
+    # check if every datadef can use its own loader
+    template = tmpdir.join("report.md")
+    template.write("{{ a.name }} {{ b.name }} {{ c.name }} {{ d.name }} {{ e.name }}")
+    tmpdir.join("a.yaml").write("name: yaml")
+    tmpdir.join("b.json").write('{"name": "json"}')
+    tmpdir.join("c.txt").write('{"name": "python"}')
+    tmpdir.join("d.yaml").write("name: libyaml")
+    reporter("-v convert '{0}/a.yaml' '{0}/e.drb'".format(tmpdir))
+    output = tmpdir.join("output.md")
+    reporter("-v --template-dir '{0}' -o '{1}' a={0}/a.yaml b={0}/b.json c:python={0}/c.txt "
+             "d:libyaml={0}/d.yaml e={0}/e.drb".format(tmpdir, output))
+    assert output.read() == "yaml json python libyaml yaml"
+
+def test_json_formats(tmpdir):
+    # check if json keeps large integers and orjson is only used on request
+    template = tmpdir.join("report.md")
+    template.write("{{ a.big }} {{ b.value }} {{ c.value }}")
+    tmpdir.join("a.json").write('{"big": 123456789012345678901234567890}')
+    tmpdir.join("b.json").write('{"value": NaN}')
+    tmpdir.join("c.txt").write('{"value": 1}')
+    output = tmpdir.join("output.md")
+    reporter("-v --template-dir '{0}' -o '{1}' a={0}/a.json b:orjson={0}/b.json "
+             "c:orjson={0}/c.txt".format(tmpdir, output))
+    assert output.read() == "123456789012345678901234567890 nan 1"
+
+def test_profile(tmpdir):
+    # check if the profile contains phases, data files, blocks and macros
+    import json
+    template = tmpdir.join("report.md")
+    template.write("{% macro hello(x) %}Hello {{ x }}{% endmacro %}"
+                   "{% block main %}{{ hello(data.name) }}{% endblock %}")
+    yaml = tmpdir.join("data.yaml")
+    yaml.write("name: World\nlist: [1, 2]\n")
+    output = tmpdir.join("output.md")
+    profile = tmpdir.join("profile.json")
+    reporter("-v --profile '%s' --profile-blocks --profile-memory --template-dir '%s' -o '%s' data=%s"
+             % (profile, tmpdir, output, yaml))
+    assert output.read() == "Hello World"
+    result = json.loads(profile.read())
+    assert [phase['name'] for phase in result['phases']] == ["environment", "template", "data", "render"]
+    assert all('peak_memory' in phase for phase in result['phases'])
+    assert result['datafiles'][0]['bytes'] == len("name: World\nlist: [1, 2]\n")
+    assert result['datafiles'][0]['objects'] == 7
+    assert result['blocks']['main']['calls'] == 1
+    assert result['macros']['hello']['calls'] == 1
+
+def test_profile_session(tmpdir):
+    # check if the blocks of templates kept by a session are restored
+    import json
+    from datareport.server import Session
+    tmpdir.join("report.md").write("{% block main %}Hello{% endblock %}")
+    profile = tmpdir.join("profile.json")
+    session = Session()
+    for _ in range(3):
+        reporter("--profile '%s' --profile-blocks --template-dir '%s' -o '%s'"
+                 % (profile, tmpdir, tmpdir.join("output.md")), session=session)
+        assert json.loads(profile.read())['blocks']['main']['calls'] == 1
+    template = session.environment(str(tmpdir), []).get_template("report.md")
+    assert template.blocks['main'].__name__ == "block_main"
+
+def test_partition(tmpdir):
+    # check if partitioned loops give the same output as for loops, also in parallel
+    body = ("{% macro row(x) %}* {{ x.name }} {{ x.value * 2 }}{% endmacro %}\n"
+            "# Items\n"
+            "{% LOOP group in data.records | groupby('kind') %}\n"
+            "## {{ group.grouper }} {{ title }}\n"
+            "  {% for item in group.list %}\n"
+            "  {{ row(item) }}\n"
+            "  {% endfor %}\n"
+            "{% END %}\n"
+            "The end.\n")
+    tmpdir.join("for.md").write(body.replace("END", "endfor").replace("LOOP", "for"))
+    tmpdir.join("partition.md").write(body.replace("END", "endpartition").replace("LOOP", "partition"))
+    data = tmpdir.join("data.yaml")
+    data.write("records:\n" + "".join("  - {name: item%d, kind: k%d, value: %d}\n" % (i, i % 7, i)
+                                    for i in range(100)))
+    tmpdir.join("title.yaml").write("x")
+    outputs = list()
+    for template, jobs in [("for.md", 1), ("partition.md", 1), ("partition.md", 3)]:
+        output = tmpdir.join("%s-%d.out" % (template, jobs))
+        reporter("-v --template-dir '%s' -t %s -J %d -o '%s' data=%s title=%s"
+                 % (tmpdir, template, jobs, output, data, tmpdir.join("title.yaml")))
+        outputs.append(output.read_binary())
+    assert b"## k6 x\n" in outputs[0]
+    assert outputs[0] == outputs[1] == outputs[2]
+
+def test_indexed_filters(tmpdir):
+    # check if the memoizing groupby, sort and selectattr give the same output as jinja2
+    from jinja2 import Environment
+    template = tmpdir.join("report.md")
+    template.write("{% for kind in ['a', 'b', 'c', 'x'] %}"
+                   "{{ kind }}: {{ data | selectattr('kind', 'equalto', kind) | map(attribute='n') | join(',') }}\n"
+                   "{{ data | selectattr('kind', 'equalto', kind) | list | length }} "
+                   "{{ data | selectattr('n') | list | length }}\n"
+                   "{% for group in data | groupby('kind') %}{{ group.grouper }}={{ group.list | length }} {% endfor %}\n"
+                   "{{ data | sort(attribute='n', reverse=True) | map(attribute='n') | first }} "
+                   "{{ data | map(attribute='kind') | sort | join }}\n"
+                   "{% endfor %}")
+    yaml = tmpdir.join("data.yaml")
+    yaml.write("".join("- {kind: %s, n: %d}\n" % ("abc"[i % 3], i) for i in range(20)))
+    output = tmpdir.join("output.md")
+    reporter("-v --template-dir '%s' -o '%s' data=%s" % (tmpdir, output, yaml))
+    from ruamel.yaml import YAML
+    expected = Environment(trim_blocks=True, lstrip_blocks=True).from_string(template.read()).render(data=YAML(typ='safe').load(yaml.read()))
+    assert output.read() == expected
+    assert output.read().startswith("a: 0,3,6,9,12,15,18\n7 19\na=7 b=7 c=6 19 aaaaaaabbbbbbbcccccc\n")
+
+def test_indexed_filters_cache(tmpdir):
+    # check if only results for datadefs and top level variables are kept
+    from jinja2 import Environment
+    from datareport import filters
+    env = Environment()
+    env.filters.update(filters.FILTERS)
+    template = env.from_string("{% set top = data | sort %}{% for x in [[2, 1], [4, 3]] %}"
+                               "{{ x | sort }}{{ data | sort }}{{ top | sort }}"
+                               "{{ data | selectattr('real', 'equalto', 1) | list }}{% endfor %}"
+                               "{{ (data | sort) is sequence }} {{ data | selectattr('real') is sequence }}")
+    context = template.new_context({'data': [3, 1, 2]})
+    output = "".join(template.root_render_func(context))
+    assert output == "[1, 2][1, 2, 3][1, 2, 3][1][3, 4][1, 2, 3][1, 2, 3][1]True False"
+    assert len(filters._caches[context]) == 4
+
+def test_memoize(tmpdir):
+    # check if memoized filters are called once per datadef and arguments,
+    # and for other values every time
+    template = tmpdir.join("report.md")
+    template.write("{% for i in range(3) %}{{ data | count('a') }}{{ data | count('b') }}{{ 5 | count('b') }}{% endfor %}"
+                   "{{ 'calls' | count('-') }}")
+    filters = tmpdir.join("filters.py")
+    filters.write("calls = []\n"
+                  "@memoize\n"
+                  "def count(value, what):\n"
+                  "    calls.append(what)\n"
+                  "    return len(calls) if what == '-' else what\n")
+    yaml = tmpdir.join("data.yaml")
+    yaml.write("[1, 2]")
+    output = tmpdir.join("output.md")
+    reporter("-v --template-dir '%s' --filter '%s' -o '%s' data=%s" % (tmpdir, filters, output, yaml))
+    assert output.read() == "abb" * 3 + "6"
+
+def test_validation(tmpdir):
+    # check if the data is validated before rendering, for all or single datadefs
+    template = tmpdir.join("report.md")
+    template.write("{{ a.name }} {{ b.name }}")
+    tmpdir.join("a.yaml").write("name: A")
+    tmpdir.join("b.json").write('{"name": 2}')
+    tmpdir.join("rows.csv").write("name\nA\nB\n")
+    tmpdir.join("dict.yaml").write("type: dict\nkeys: {type: str}\n")
+    tmpdir.join("name.yaml").write("type: dict\nvalues: {type: str}\n")
+    tmpdir.join("rows.yaml").write("type: list\nvalues: {type: dict, values: {type: str}}\n")
+    output = tmpdir.join("output.md")
+    command = "-v --template-dir '{0}' -o '{1}' a={0}/a.yaml b={0}/b.json r={0}/rows.csv ".format(tmpdir, output)
+    assert reporter(command + "--validation={0}/dict.yaml --validation=r={0}/rows.yaml".format(tmpdir)) == 1
+    assert not output.check()
+    assert reporter(command + "--validation=a={0}/dict.yaml --validation=a={0}/name.yaml "
+                    "--validation=b={0}/dict.yaml --validation=r={0}/rows.yaml".format(tmpdir)) == 0
+    assert output.read() == "A 2"
+    assert reporter(command + "--validation=b={0}/name.yaml".format(tmpdir)) == 1
+    reporter("-v convert '{0}/b.json' '{0}/b.drb'".format(tmpdir))
+    assert reporter(command.replace("b.json", "b.drb") + "--lazy --validation=b={0}/dict.yaml".format(tmpdir)) == 0
+    assert reporter(command.replace("b.json", "b.drb") + "--lazy --validation=b={0}/name.yaml".format(tmpdir)) == 1
+
+def test_compact(tmpdir):
+    # check if records stored compactly give the same output as dicts
+    template = tmpdir.join("report.md")
+    template.write("{% for building in phonelist | groupby('Building') %}{{ building.grouper }}:"
+                   "{% for person in building.list | sort(attribute='Name') %} {{ person.Name }}"
+                   "{{ person['Room'] }}{{ person.get('Phone', '-') }}{{ person | length }}{% endfor %}\n"
+                   "{% endfor %}"
+                   "{% for serial, entry in data.serial | dictsort %}{{ serial }}={{ entry.model }} "
+                   "{{ entry.items() | list | length }} {{ 'model' in entry }}\n{% endfor %}")
+    tmpdir.join("list.csv").write("Name,Room,Phone,Building\nBob,1,22,A\nAlice,2,33,B\nCarl,3,44,A\n")
+    tmpdir.join("data.yaml").write("serial:\n  X1: {model: M1}\n  X2: {model: M2, type: laptop}\n")
+    tmpdir.join("phonelist.yaml").write(
+        "type: list\nvalues: {type: dictdescent, mandatory: [Name, Room, Phone, Building]}\n")
+    tmpdir.join("inventory.yaml").write(
+        "type: dict\nvalues:\n  type: dict\n  values: {type: dictdescent, mandatory: [model], allowed: [type]}\n")
+    outputs = list()
+    for options in ["", "--compact"]:
+        output = tmpdir.join("output%d.md" % len(outputs))
+        assert reporter("-v --template-dir '{0}' -o '{1}' {2} --validation=phonelist={0}/phonelist.yaml "
+                        "--validation=data={0}/inventory.yaml phonelist={0}/list.csv data={0}/data.yaml"
+                        .format(tmpdir, output, options)) == 0
+        outputs.append(output.read())
+    assert outputs[0] == "A: Bob1224 Carl3444B: Alice2334X1=M1 1 True\nX2=M2 2 True\n"
+    assert outputs[1] == outputs[0]
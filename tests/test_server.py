@@ -0,0 +1,92 @@
+from datareport.server import MemoryCache, Server
+from datareport.client import connect, request
+import io
+import threading
+import pytest
+
+
+@pytest.fixture
+def server(tmpdir):
+    path = str(tmpdir.join("server.sock"))
+    server = Server(path)
+    thread = threading.Thread(target=server.serve)
+    thread.start()
+    yield path, server
+    request(connect(path), {'stop': True})
+    thread.join()
+
+
+def render(path, cwd, argv):
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    status = request(connect(path), {'argv': argv, 'cwd': str(cwd)}, stdout, stderr)
+    return status, stdout.getvalue(), stderr.getvalue()
+
+
+def test_server(tmpdir, server):
+    # reports are rendered by the server, data is parsed again when changed
+    path, srv = server
+    tmpdir.join("report.md").write("# Hello {{ data.name }}")
+    data = tmpdir.join("data.yaml")
+    data.write("name: World")
+
+    status, output, messages = render(path, tmpdir, ["data=data.yaml"])
+    assert status == 0
+    assert output == "# Hello World"
+    assert "loading template" in messages
+
+    status, output, _ = render(path, tmpdir, ["data=data.yaml", "-o", "output.md"])
+    assert status == 0
+    assert output == ""
+    assert tmpdir.join("output.md").read() == "# Hello World"
+    assert len(srv.session.cache.entries) == 1
+    assert len(srv.session.environments) == 1
+
+    data.write("name: Server")
+    status, output, _ = render(path, tmpdir, ["data=data.yaml"])
+    assert output == "# Hello Server"
+
+
+def test_server_filters(tmpdir, server):
+    # changed filter files give a new environment
+    path, srv = server
+    tmpdir.join("report.md").write("{{ 'x' | shout }}")
+    filters = tmpdir.join("filters.py")
+    filters.write("def shout(s):\n    return s.upper()\n")
+    assert render(path, tmpdir, ["--filter=filters.py"])[1] == "X"
+    filters.write("def shout(s):\n    return s.upper() + '!!'\n")
+    assert render(path, tmpdir, ["--filter=filters.py"])[1] == "X!!"
+
+
+def test_server_errors(tmpdir, server):
+    # errors are reported to the client and the server keeps running
+    path, _ = server
+    tmpdir.join("report.md").write("{{ data.name }")
+    status, _, messages = render(path, tmpdir, [])
+    assert status == 1
+    assert "TemplateSyntaxError" in messages
+    status, _, messages = render(path, tmpdir, ["--no-such-option"])
+    assert status == 1
+    assert "Usage:" in messages
+
+
+def test_memory_cache(tmpdir):
+    # the least recently used files are dropped above the maximum size
+    loads = []
+    def loader(infile):
+        loads.append(infile.name)
+        return infile.read()
+    files = []
+    for name in "abc":
+        files.append(tmpdir.join(name + ".yaml"))
+        files[-1].write(name * 10)
+    a, b, c = (str(f) for f in files)
+    cache = MemoryCache(maxsize=25)
+    assert cache.load(a, "yaml", loader) == "a" * 10
+    assert cache.load(b, "yaml", loader) == "b" * 10
+    assert cache.load(a, "yaml", loader) == "a" * 10
+    assert loads == [a, b]
+    cache.load(c, "yaml", loader)
+    assert [key[0] for key in cache.entries] == [a, c]
+    cache.load(b, "yaml", loader)
+    assert loads == [a, b, c, b]
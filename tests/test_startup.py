@@ -0,0 +1,57 @@
+import os
+import re
+import subprocess
+import sys
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# heavy dependencies which must only be imported when they are used
+HEAVY = ['jinja2', 'ruamel', 'yaml', 'docopt', 'pprint', 'multiprocessing',
+         'json', 'pickle', 'tempfile', 'mmap']
+
+# budget for importing a module in a fresh interpreter, in microseconds
+BUDGET = 80000
+
+def run(code, *args):
+    return subprocess.run([sys.executable] + list(args) + ['-c', code], cwd=ROOT,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, check=True)
+
+def loaded(code):
+    # return the heavy modules loaded after running `code`
+    result = run(code + "\nprint(' '.join(sorted(set("
+                 "m.split('.')[0] for m in sys.modules) & set(%r))))" % HEAVY)
+    return result.stdout.splitlines()[-1].split()
+
+def importtime(module):
+    # return the cumulative import time of `module` in microseconds
+    result = run("import %s" % module, '-X', 'importtime')
+    times = re.findall(r'\|\s*(\d+) \| %s$' % re.escape(module), result.stderr, re.M)
+    assert times, result.stderr
+    return int(times[-1])
+
+@pytest.mark.parametrize("module", ["datareport.reporter", "datareport.verify"])
+def test_import(module):
+    # importing does not load any heavy dependencies
+    assert loaded("import sys, %s" % module) == []
+
+def test_help():
+    # --help only needs docopt
+    code = "import sys\nfrom datareport.%s import main\ntry: main('-h')\nexcept SystemExit: pass"
+    assert loaded(code % "reporter") == ['docopt']
+    assert loaded(code % "verify") == ['docopt']
+
+def test_json_data(tmpdir):
+    # a report from JSON data does not need ruamel
+    tmpdir.join("report.md").write("{{ data.name }}")
+    tmpdir.join("data.json").write('{"name": "World"}')
+    code = "import sys\nfrom datareport.reporter import main\nmain(%r)" % (
+        "--template-dir '%s' data='%s' -o '%s'" % (tmpdir, tmpdir.join("data.json"), tmpdir.join("out.md")))
+    assert 'ruamel' not in loaded(code)
+    assert tmpdir.join("out.md").read() == "World"
+
+@pytest.mark.parametrize("module", ["datareport.reporter", "datareport.verify"])
+def test_import_time(module):
+    # the best of a few runs, since timings vary with the machine load
+    assert min(importtime(module) for _ in range(3)) < BUDGET
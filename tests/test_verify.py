@@ -0,0 +1,210 @@
+from datareport.verify import Validator, main as verify
+import pytest
+
+RULES = '''
+type: list
+values:
+  type: dict
+  keys: {type: str}
+  values: {type: int, min: 0}
+'''
+
+def test_validate_file(tmpdir, capsys):
+    # check if a complete file is validated
+    rules = tmpdir.join("rules.yaml")
+    rules.write(RULES)
+    data = tmpdir.join("data.yaml")
+    data.write("- {a: 1}\n- {b: 2}\n")
+    verify("--validation '%s' '%s'" % (rules, data))
+    assert capsys.readouterr().out == "valid.\n"
+
+    data.write("- {a: 1}\n- {b: -2}\n")
+    verify("--validation '%s' '%s'" % (rules, data))
+    assert capsys.readouterr().out == "INVALID!\n"
+
+def test_stream_yaml(tmpdir, capsys):
+    # check if sequence elements of all documents are reported separately
+    rules = tmpdir.join("rules.yaml")
+    rules.write(RULES)
+    data = tmpdir.join("data.yaml")
+    data.write("- {a: 1}\n- {b: -2}\n---\n- {c: 3}\n- {d: x}\n")
+    validator = Validator(rulefile=str(rules))
+    errors = validator.validate_stream(str(data))
+    assert [path for path, _ in errors] == ["/:0:1", "/:1:1"]
+
+    verify("--stream --validation '%s' '%s'" % (rules, data))
+    assert capsys.readouterr().out.splitlines() == [
+        "/:0:1:values:-2: -2 is smaller than min 0",
+        "/:1:1:values:x: expected int, got str!",
+        "INVALID!"]
+
+def test_stream_not_list(tmpdir, capsys):
+    # check if documents are not split for other rules than lists
+    rules = tmpdir.join("rules.yaml")
+    rules.write("type: dict\nvalues: {type: int}\n")
+    data = tmpdir.join("data.yaml")
+    data.write("- {a: 1}\n- {b: 2}\n")
+    for options in ("", "--stream "):
+        assert verify("%s--validation '%s' '%s'" % (options, rules, data)) == 1
+        assert capsys.readouterr().out.splitlines()[-1] == "INVALID!"
+
+    data.write("{a: 1, b: 2}\n")
+    for options in ("", "--stream "):
+        assert verify("%s--validation '%s' '%s'" % (options, rules, data)) == 0
+        assert capsys.readouterr().out == "valid.\n"
+
+def test_stream_jsonlines(tmpdir):
+    # check if every line of a JSON Lines file is one record
+    rules = tmpdir.join("rules.yaml")
+    rules.write(RULES)
+    data = tmpdir.join("data.jsonl")
+    data.write('{"a": 1}\n\n{"b": 2}\n{"c": "3"}\n')
+    errors = Validator(rulefile=str(rules)).validate_stream(str(data))
+    assert [path for path, _ in errors] == ["/:4"]
+
+    # a malformed line is reported as invalid record, the others are checked
+    data.write('{"a": 1}\n{"b": \n{"c": "3"}\n')
+    errors = Validator(rulefile=str(rules)).validate_stream(str(data))
+    assert [path for path, _ in errors] == ["/:2", "/:3"]
+    assert errors[0][1].startswith("/:2: invalid JSON: ")
+
+def test_jobs(tmpdir, capsys):
+    # check if parallel validation of files and elements gives stable results
+    rules = tmpdir.join("rules.yaml")
+    rules.write(RULES)
+    for i in range(4):
+        tmpdir.join("data%d.yaml" % i).write("".join("- {a: %d}\n" % j for j in range(i * 2 - 1, 50)))
+    pattern = "'%s'" % tmpdir.join("data*.yaml")
+
+    for jobs in (1, 2, 8):
+        assert verify("--jobs %d --validation '%s' %s" % (jobs, rules, pattern)) == 1
+        out = capsys.readouterr().out.splitlines()
+        assert [line.rsplit(": ", 1)[1] for line in out] == ["INVALID!", "valid.", "valid.", "valid."]
+
+    single = tmpdir.join("data3.yaml")
+    assert verify("--jobs 3 --validation '%s' '%s'" % (rules, single)) == 0
+    assert capsys.readouterr().out == "valid.\n"
+    assert verify("--jobs 3 --validation '%s' '%s'" % (rules, tmpdir.join("data0.yaml"))) == 1
+    assert capsys.readouterr().out == "INVALID!\n"
+
+def test_all(tmpdir, capsys):
+    # check if all violations are reported in one pass
+    rules = tmpdir.join("rules.yaml")
+    rules.write(RULES)
+    data = tmpdir.join("data.yaml")
+    data.write("- {a: 1, b: -1}\n- 7\n- {c: x}\n")
+    assert verify("--all --validation '%s' '%s'" % (rules, data)) == 1
+    assert capsys.readouterr().out.splitlines() == [
+        "/:0:values:-1: -1 is smaller than min 0",
+        "/:1: expected dict, got int!",
+        "/:2:values:x: expected int, got str!",
+        "INVALID!"]
+
+    violations = Validator(rulefile=str(rules)).file_violations(str(data))
+    assert [v.value for v in violations] == [-1, 7, "x"]
+    assert [v.rule['type'] for v in violations] == ["int", "dict", "int"]
+
+def test_state(tmpdir, capsys):
+    # check if incremental validation gives the same verdict as a full run
+    rules = tmpdir.join("rules.yaml")
+    rules.write(RULES)
+    data = tmpdir.join("data.yaml")
+    state = tmpdir.join("state.json")
+    cmd = "--state '%s' --validation '%s' '%s'" % (state, rules, data)
+
+    data.write("- {a: 1}\n- {b: 2}\n")
+    assert verify(cmd) == 0
+    assert state.check()
+    data.write("- {a: 1}\n- {b: -2}\n")
+    assert verify(cmd) == 1
+    data.write("- {a: 1}\n- {b: 3}\n")
+    assert verify(cmd) == 0
+    assert capsys.readouterr().out == "valid.\nINVALID!\nvalid.\n"
+
+    rules.write(RULES.replace("min: 0", "min: 2"))
+    assert verify(cmd) == 1
+
+def test_doctests():
+    # the examples in the docstrings of the validators hold
+    import doctest
+    import datareport.verify
+    result = doctest.testmod(datareport.verify)
+    assert result.attempted > 0
+    assert result.failed == 0
+
+DICTDESCENT = {'type': 'dictdescent', 'mandatory': ['a'], 'allowed': ['b'],
+               'deprecated': {'c': 'use b'}, 'forbidden': {'d': 'never'}}
+
+@pytest.mark.parametrize("rules,item,valid", [
+    ({'type': 'str'}, "x", True),
+    ({'type': 'str'}, 1, False),
+    ({'type': 'str', 'regex': r'[a-z]+'}, "abc", True),
+    ({'type': 'str', 'regex': r'[a-z]+'}, "abc1", False),
+    ({'type': 'int', 'min': 0, 'max': 2}, 2, True),
+    ({'type': 'int', 'min': 0, 'max': 2}, 3, False),
+    ({'type': 'int', 'inf': 0, 'sup': 2}, 0, False),
+    ({'type': 'int'}, True, True),
+    ({'type': 'int'}, 1.0, False),
+    ({'type': 'float', 'inf': 0.5}, 0.75, True),
+    ({'type': 'float'}, 1, False),
+    ({'type': 'in', 'values': [{'type': 'int'}, {'type': 'str'}]}, "x", True),
+    ({'type': 'in', 'values': [{'type': 'int'}, {'type': 'str'}]}, 1.5, False),
+    ({'type': 'list', 'values': {'type': 'int'}}, [], True),
+    ({'type': 'list', 'values': {'type': 'int'}}, [1, "x"], False),
+    ({'type': 'list'}, {}, False),
+    ({'type': 'dict', 'keys': {'type': 'str'}, 'values': {'type': 'int'}}, {"a": 1}, True),
+    ({'type': 'dict', 'keys': {'type': 'str'}}, {1: 1}, False),
+    (DICTDESCENT, {'a': 1, 'b': 2, 'c': 3}, True),
+    (DICTDESCENT, {'b': 2}, False),
+    (DICTDESCENT, {'a': 1, 'd': 4}, False),
+    (DICTDESCENT, {'a': 1, 'e': 5}, False),
+    (dict(DICTDESCENT, **{'others-allowed': True}), {'a': 1, 'e': 5}, True),
+    (DICTDESCENT, ['a'], False),
+])
+def test_compiled_rules(rules, item, valid):
+    # both modes of the compiled checkers agree on the verdict
+    validator = Validator(rules=rules)
+    assert validator.validate(item) == valid
+    assert (validator.violations(item) == []) == valid
+
+def test_compiled_rules_random():
+    # random nested rules and values give the same verdict in both modes
+    import random
+    generator = random.Random(6)
+    scalars = [0, 1, -1, 2.5, "a", "ab1", None, True]
+
+    def rule(depth):
+        kind = generator.choice(['str', 'int', 'float', 'in', 'list', 'dict', 'dictdescent']
+                                if depth else ['str', 'int', 'float'])
+        rules = {'type': kind}
+        if kind == 'str' and generator.random() < 0.5:
+            rules['regex'] = r'[a-z]+'
+        elif kind in ('int', 'float'):
+            for bound in generator.sample(['min', 'inf', 'sup', 'max'], 2):
+                rules[bound] = generator.choice([-1, 0, 1, 2])
+        elif kind == 'in':
+            rules['values'] = [rule(depth - 1) for _ in range(2)]
+        elif kind in ('list', 'dict') and generator.random() < 0.8:
+            rules['values'] = rule(depth - 1)
+        elif kind == 'dictdescent':
+            rules['mandatory'] = ['a']
+            rules['allowed'] = ['b']
+            rules['others-allowed'] = generator.random() < 0.3
+        return rules
+
+    def value(depth):
+        kind = generator.choice(['scalar', 'list', 'dict'] if depth else ['scalar'])
+        if kind == 'list':
+            return [value(depth - 1) for _ in range(generator.randint(0, 3))]
+        if kind == 'dict':
+            return {generator.choice("abc"): value(depth - 1) for _ in range(generator.randint(0, 3))}
+        return generator.choice(scalars)
+
+    verdicts = set()
+    for _ in range(3000):
+        validator = Validator(rules=rule(3))
+        item = value(3)
+        valid = validator.validate(item)
+        assert (validator.violations(item) == []) == valid
+        verdicts.add(valid)
+    assert verdicts == {True, False}
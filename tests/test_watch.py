@@ -0,0 +1,120 @@
+from datareport.watch import Inotify, Poller, changes, watcher
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def later(seconds, func, *args):
+    timer = threading.Timer(seconds, func, args)
+    timer.start()
+    return timer
+
+
+@pytest.mark.parametrize("kind", [Inotify, Poller])
+def test_changes(tmpdir, kind, monkeypatch):
+    # only watched files are reported, writes in quick succession at once
+    monkeypatch.setattr('datareport.watch.INTERVAL', 0.02)
+    monkeypatch.setattr('datareport.watch.watcher', kind)
+    first = tmpdir.join("first.yaml")
+    second = tmpdir.join("second.yaml")
+    first.write("a: 1")
+    second.write("b: 1")
+    later(0.1, tmpdir.join("other.yaml").write, "c: 1")
+    later(0.2, first.write, "a: 2")
+    later(0.25, second.write, "b: 2")
+    assert changes([str(first), str(second)], delay=0.2) == {str(first), str(second)}
+
+    # a replaced file is noticed, too
+    replacement = tmpdir.join("first.yaml.tmp")
+    replacement.write("a: 3")
+    later(0.1, os.rename, str(replacement), str(first))
+    assert changes([str(first), str(second)], delay=0.1) == {str(first)}
+
+
+def test_changes_since(tmpdir):
+    # files written before watching started are not missed
+    data = tmpdir.join("data.yaml")
+    started = time.time() - 10
+    data.write("a: 1")
+    assert changes([str(data)], delay=0.05, since=started) == {str(data)}
+
+
+def test_watcher_fallback(tmpdir):
+    # polling is used when inotify cannot watch a directory
+    missing = str(tmpdir.join("missing", "data.yaml"))
+    watching = watcher([missing])
+    assert isinstance(watching, Poller)
+    assert watching.wait(0) == set()
+
+
+def waitfor(condition, timeout=20):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_watch(tmpdir):
+    # the report is rendered again when the data, an included template or a
+    # filter file change
+    tmpdir.join("report.md").write("{% include 'header.md' %}{{ data.name | shout }}")
+    header = tmpdir.join("header.md")
+    header.write("# ")
+    filters = tmpdir.join("filters.py")
+    filters.write("def shout(s):\n    return s.upper()\n")
+    data = tmpdir.join("data.yaml")
+    data.write("name: World")
+    output = tmpdir.join("output.md")
+    code = "from datareport.reporter import main\nmain(%r)" % [
+        "--watch", "--template-dir", str(tmpdir), "--filter", str(filters),
+        "-o", str(output), "data=%s" % data]
+    process = subprocess.Popen([sys.executable, "-c", code], cwd=ROOT,
+                               stderr=subprocess.PIPE, universal_newlines=True)
+    try:
+        read = lambda: output.read() if output.check() else None
+        waitfor(lambda: read() == "# WORLD")
+        data.write("name: Watch")
+        waitfor(lambda: read() == "# WATCH")
+        header.write("## ")
+        waitfor(lambda: read() == "## WATCH")
+        filters.write("def shout(s):\n    return s.upper() + '!'\n")
+        waitfor(lambda: read() == "## WATCH!")
+    finally:
+        process.send_signal(signal.SIGINT)
+        _, messages = process.communicate(timeout=20)
+    assert process.returncode == 0
+    assert messages.count("watching 4 files") >= 4
+    assert "creating environment" in messages
+
+
+def test_watch_stdout(tmpdir):
+    # without -o every render is written to stdout, which stays open
+    tmpdir.join("report.md").write("{{ data.name }};")
+    data = tmpdir.join("data.yaml")
+    data.write("name: World")
+    code = "from datareport.reporter import main\nmain(%r)" % [
+        "--watch", "--template-dir", str(tmpdir), "-J", "2", "data=%s" % data]
+    process = subprocess.Popen([sys.executable, "-c", code], cwd=ROOT, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, universal_newlines=True)
+    chunks = []
+    reader = threading.Thread(target=lambda: chunks.extend(
+        iter(lambda: os.read(process.stdout.fileno(), 1024), b'')))
+    reader.start()
+    try:
+        read = lambda: b"".join(chunks).decode()
+        waitfor(lambda: read() == "World;")
+        data.write("name: Watch")
+        waitfor(lambda: read() == "World;Watch;")
+    finally:
+        process.send_signal(signal.SIGINT)
+        _, messages = process.communicate(timeout=20)
+        reader.join()
+    assert process.returncode == 0
+    assert "--jobs is ignored with --watch" in messages
+    assert "Error" not in messages